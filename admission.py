@@ -0,0 +1,201 @@
+# admission.py - Memory-budgeted admission control for uploads and downloads
+import asyncio
+import json
+import logging
+import math
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted within the queue timeout"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps the bytes and requests in flight across all transfers.
+
+    Requests over budget wait (up to queue_timeout) for capacity. No single
+    user may hold more than user_share of the byte budget or the concurrency
+    limit, so one client can't starve everyone else.
+    """
+
+    def __init__(
+        self,
+        max_bytes=64 * 1024 * 1024,
+        max_concurrent=8,
+        user_share=0.5,
+        queue_timeout=10.0,
+        max_queue=32,
+    ):
+        self.max_bytes = max_bytes
+        self.max_concurrent = max_concurrent
+        self.user_max_bytes = max(1, int(max_bytes * user_share))
+        self.user_max_concurrent = max(1, int(max_concurrent * user_share))
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+
+        self._condition = asyncio.Condition()
+        self._bytes = 0
+        self._active = 0
+        self._user_bytes: dict[str, int] = {}
+        self._user_active: dict[str, int] = {}
+        self._waiting = 0
+        self._admitted_total = 0
+        self._rejected_total = 0
+
+    def _fits(self, user, nbytes):
+        return (
+            self._active < self.max_concurrent
+            and self._bytes + nbytes <= self.max_bytes
+            and self._user_active.get(user, 0) < self.user_max_concurrent
+            and self._user_bytes.get(user, 0) + nbytes <= self.user_max_bytes
+        )
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.queue_timeout))
+
+    @asynccontextmanager
+    async def admit(self, user, nbytes):
+        """
+        Hold a share of the budget for the duration of the block
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait times out
+        """
+        # A request bigger than a user's share could never fit; let it run
+        # alone instead of waiting forever
+        nbytes = min(max(0, nbytes), self.user_max_bytes)
+
+        async with self._condition:
+            if not self._fits(user, nbytes):
+                if self._waiting >= self.max_queue:
+                    self._rejected_total += 1
+                    raise AdmissionRejected("queue full", self._retry_after())
+
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: self._fits(user, nbytes)),
+                        timeout=self.queue_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self._rejected_total += 1
+                    raise AdmissionRejected("queue timeout", self._retry_after())
+                finally:
+                    self._waiting -= 1
+
+            self._bytes += nbytes
+            self._active += 1
+            self._user_bytes[user] = self._user_bytes.get(user, 0) + nbytes
+            self._user_active[user] = self._user_active.get(user, 0) + 1
+            self._admitted_total += 1
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._bytes -= nbytes
+                self._active -= 1
+                self._user_bytes[user] -= nbytes
+                self._user_active[user] -= 1
+                if not self._user_active[user]:
+                    del self._user_bytes[user]
+                    del self._user_active[user]
+                self._condition.notify_all()
+
+    def stats(self):
+        return {
+            "in_flight_bytes": self._bytes,
+            "in_flight_requests": self._active,
+            "queue_depth": self._waiting,
+            "max_bytes": self.max_bytes,
+            "max_concurrent": self.max_concurrent,
+            "admitted_total": self._admitted_total,
+            "rejected_total": self._rejected_total,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that runs matching transfer routes through an AdmissionController
+
+    It sits inside SessionMiddleware so requests can be grouped by user, and
+    admits uploads before their body is read, using Content-Length as the
+    cost; uploads without one are charged the largest allowed upload.
+    Downloads are priced by download_cost(scope), an async callable that
+    returns the object's size if it's known, and otherwise download_estimate.
+    """
+
+    def __init__(
+        self,
+        app,
+        controller,
+        upload_paths=("/upload",),
+        download_paths=("/download",),
+        download_estimate=4 * 1024 * 1024,
+        download_cost=None,
+        max_upload_bytes=16 * 1024 * 1024,
+    ):
+        self.app = app
+        self.controller = controller
+        self.upload_paths = upload_paths
+        self.download_paths = download_paths
+        self.download_estimate = download_estimate
+        self.download_cost = download_cost
+        self.max_upload_bytes = max_upload_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        if scope["method"] == "POST" and path in self.upload_paths:
+            headers = dict(scope["headers"])
+            try:
+                cost = int(headers[b"content-length"])
+            except (KeyError, ValueError):
+                # A chunked body could be any size up to the upload limit
+                cost = self.max_upload_bytes
+        elif scope["method"] == "GET" and path in self.download_paths:
+            cost = None
+            if self.download_cost:
+                try:
+                    cost = await self.download_cost(scope)
+                except Exception as e:
+                    logger.warning(f"Could not price download {path}: {e}")
+            if cost is None:
+                cost = self.download_estimate
+        else:
+            return await self.app(scope, receive, send)
+
+        session = scope.get("session") or {}
+        client = scope.get("client") or ("unknown", 0)
+        user = session.get("user") or client[0]
+
+        try:
+            async with self.controller.admit(user, cost):
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            logger.warning(f"🚦 Rejected {path} for {user}: {e.reason}")
+            body = json.dumps(
+                {"message": "Server is busy, please retry shortly"}
+            ).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"retry-after", str(e.retry_after).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
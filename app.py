@@ -1,33 +1,63 @@
 # app.py - FIXED VERSION WITH PROPER SESSION MANAGEMENT
+from startup_profile import startup_timer, FirstRequestTimer  # Import first: starts the clock
 from fastapi import FastAPI, Request, Form, UploadFile, Depends, HTTPException, status
 from fastapi.responses import (
     HTMLResponse,
+    Response,
     RedirectResponse,
     JSONResponse,
     StreamingResponse,
 )
 from fastapi.templating import Jinja2Templates
 from werkzeug.utils import secure_filename
-from urllib.parse import quote as url_quote
+from urllib.parse import parse_qs, quote as url_quote
 import os
 from datetime import datetime
 import logging
-from ipfs_client import IPFSClient
+from storage import StorageSettings, storage_from_settings
 from blockchain import Blockchain
-from pydantic_settings import BaseSettings
+from upload_queue import UploadQueue, PENDING_STATUSES
+from listing_cache import ListingCache, etag_matches
+from admission import AdmissionController, AdmissionMiddleware
+from previews import PreviewPipeline, PREVIEW_MEDIA_TYPE, can_preview
+from chunk_store import ChunkStore
+from reconcile import reconcile_forever, record_stored_object
+from compression import (
+    maybe_compress_file,
+    decompress_chunks,
+    iter_chunks,
+    accepts_encoding,
+)
 from starlette.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from authlib.integrations.starlette_client import OAuth
 from database import db_manager, get_db
-from database import User, File
+from database import (
+    User,
+    File,
+    FileEncoding,
+    ChunkManifest,
+    StoredObject,
+    Preview,
+    UploadJob,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
+import base64
+import itertools
+import json
 import secrets
+import shutil
 import traceback
+import uuid
+import asyncio
 
+startup_timer.mark("imports")
 
-class Settings(BaseSettings):
-    UPLOAD_FOLDER: str = "uploads"
+
+class Settings(StorageSettings):
+    # Storage backend settings (UPLOAD_FOLDER, STORAGE_BACKEND, ...) are
+    # inherited from StorageSettings
     MAX_CONTENT_LENGTH: int = 16 * 1024 * 1024
     SECRET_KEY: str = secrets.token_urlsafe(32)  # Generate random secret key
     TEMPLATES_AUTO_RELOAD: bool = True
@@ -35,6 +65,24 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_SECRET: str
     GOOGLE_REDIRECT_URI: str
     DATABASE_URL: str
+    DIRECT_TRANSFERS: bool = False  # Browser talks to Filebase via presigned URLs
+    PRESIGNED_URL_EXPIRY: int = 15 * 60
+    ASYNC_UPLOADS: bool = False  # Stage locally, answer 202 and pin in the background
+    UPLOAD_WORKERS: int = 2
+    UPLOAD_MAX_ATTEMPTS: int = 5
+    LISTING_CACHE_SIZE: int = 256  # Users whose rendered index page is cached
+    STORAGE_COMPRESSION: str = "off"  # "off", "gzip" or "zstd"
+    CHUNKED_STORAGE: bool = False  # Store uploads as deduplicated CDC chunks
+    CHUNK_AVG_SIZE: int = 1024 * 1024
+    CHUNK_PREFETCH: int = 4
+    RECONCILE_INTERVAL: int = 0  # Seconds between bucket inventory syncs, 0 = off
+    ADMISSION_MAX_BYTES: int = 64 * 1024 * 1024  # In-flight transfer byte budget
+    ADMISSION_MAX_CONCURRENT: int = 8
+    ADMISSION_USER_SHARE: float = 0.5  # Max fraction of the budget one user holds
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_DOWNLOAD_ESTIMATE: int = 4 * 1024 * 1024
+    PREVIEW_MAX_SIZE: int = 256  # Longest edge of generated thumbnails, in pixels
 
     class Config:
         env_file = ".env"
@@ -44,12 +92,52 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
+startup_timer.mark("settings")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+admission = AdmissionController(
+    max_bytes=settings.ADMISSION_MAX_BYTES,
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    user_share=settings.ADMISSION_USER_SHARE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+)
+
+
+async def download_cost(scope) -> int | None:
+    """Size of the file a /download request asks for, if we have it on record"""
+    ipfs_hash = parse_qs(scope["query_string"].decode()).get("ipfs_hash", [None])[0]
+    if not ipfs_hash:
+        return None
+
+    async with db_manager.async_session_maker() as session:
+        manifest_size = await session.execute(
+            select(ChunkManifest.size).where(ChunkManifest.ipfs_hash == ipfs_hash)
+        )
+        size = manifest_size.scalar_one_or_none()
+        if size is None:
+            object_size = await session.execute(
+                select(StoredObject.size)
+                .where(StoredObject.ipfs_hash == ipfs_hash)
+                .limit(1)
+            )
+            size = object_size.scalar_one_or_none()
+    return size
+
+
+# Added before SessionMiddleware so it runs inside it and can see the user
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    download_estimate=settings.ADMISSION_DOWNLOAD_ESTIMATE,
+    download_cost=download_cost,
+    max_upload_bytes=settings.MAX_CONTENT_LENGTH,
+)
+
 # ✅ Enhanced session security with strict settings
 app.add_middleware(
     SessionMiddleware,
@@ -70,6 +158,7 @@ oauth.register(
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
+app.add_middleware(FirstRequestTimer)
 
 
 # ✅ Dependency to check if user is authenticated
@@ -186,10 +275,38 @@ async def startup_db_client():
     await db_manager.connect(settings.DATABASE_URL)
     logger.info("✅ Database connected successfully")
 
+    startup_timer.mark("database")
+
+    if settings.ASYNC_UPLOADS:
+        await upload_queue.start()
+
+    # Build the S3 client off the critical path so the port binds first
+    app.state.warm_up_task = asyncio.create_task(warm_up_clients())
+
+    app.state.reconcile_task = None
+    if settings.RECONCILE_INTERVAL > 0:
+        app.state.reconcile_task = asyncio.create_task(
+            reconcile_forever(ipfs_client, settings.RECONCILE_INTERVAL)
+        )
+
+
+async def warm_up_clients():
+    """Build heavy clients in the background after startup"""
+    try:
+        await asyncio.to_thread(ipfs_client.warm_up)
+        startup_timer.mark("storage client warm")
+        logger.info("🔥 Storage client warmed up")
+    except Exception as e:
+        logger.warning(f"Storage client warm-up failed: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Close PostgreSQL connection on shutdown"""
+    if settings.ASYNC_UPLOADS:
+        await upload_queue.stop()
+    if app.state.reconcile_task:
+        app.state.reconcile_task.cancel()
     await db_manager.close()
 
 
@@ -219,11 +336,48 @@ ALLOWED_EXTENSIONS = {
 
 os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
 
-ipfs_client = IPFSClient()
+# Uploads are copied to disk in pieces this size instead of read whole
+COPY_CHUNK = 1024 * 1024
+
+ipfs_client = storage_from_settings(settings)
+if settings.DIRECT_TRANSFERS and not ipfs_client.supports_presigned_urls:
+    logger.warning(
+        f"DIRECT_TRANSFERS needs presigned URLs, which {settings.STORAGE_BACKEND} storage can't issue; disabling"
+    )
+    settings.DIRECT_TRANSFERS = False
 blockchain = Blockchain()
+listing_cache = ListingCache(max_entries=settings.LISTING_CACHE_SIZE)
+chunk_store = ChunkStore(
+    ipfs_client, avg_size=settings.CHUNK_AVG_SIZE, prefetch=settings.CHUNK_PREFETCH
+)
+preview_pipeline = PreviewPipeline(
+    ipfs_client,
+    cache_folder=os.path.join(settings.UPLOAD_FOLDER, "previews"),
+    max_size=settings.PREVIEW_MAX_SIZE,
+)
+
+
+def on_job_recorded(job: UploadJob):
+    """Follow-up work once a background upload has its File row"""
+    listing_cache.invalidate(job.owner_email)
+    preview_pipeline.submit(
+        job.ipfs_hash, job.filename, job.staged_path, job.content_encoding
+    )
+
+
+upload_queue = UploadQueue(
+    ipfs_client,
+    blockchain,
+    staging_folder=os.path.join(settings.UPLOAD_FOLDER, "staging"),
+    workers=settings.UPLOAD_WORKERS,
+    max_attempts=settings.UPLOAD_MAX_ATTEMPTS,
+    on_file_recorded=on_job_recorded,
+    chunk_store=chunk_store if settings.CHUNKED_STORAGE else None,
+)
 
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["timestamp_to_string"] = timestamp_to_string
+startup_timer.mark("clients")
 
 
 @app.exception_handler(413)
@@ -280,19 +434,150 @@ async def index_redirect(request: Request):
 
 async def show_index(request: Request, user: User, db: AsyncSession):
     """Display main page with user's files"""
+    # The page only changes when the user's files do, so the listing version
+    # doubles as an ETag and as the key for the rendered-page cache
+    version = listing_cache.version(user.email)
+    headers = {
+        "ETag": listing_cache.etag(user.email, version),
+        "Cache-Control": "private, no-cache",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        logger.info(f"📊 Listing unchanged for user {user.email}")
+        return Response(status_code=304, headers=headers)
+
+    html = listing_cache.get(user.email, version)
+    if html is None:
+        # Get only user's files from the database
+        files_result = await db.execute(
+            select(File).where(File.owner_email == user.email)
+        )
+        user_files = files_result.scalars().all()
+
+        logger.info(f"📊 Displaying {len(user_files)} files for user {user.email}")
+
+        html = templates.get_template("index.html").render(
+            {
+                "request": request,
+                "chain": user_files,
+                "current_user": user,
+                "direct_transfers": settings.DIRECT_TRANSFERS,
+                "can_preview": can_preview,
+            }
+        )
+        listing_cache.put(user.email, version, html)
 
-    # Get only user's files from the database
-    files_result = await db.execute(select(File).where(File.owner_email == user.email))
-    user_files = files_result.scalars().all()
+    return HTMLResponse(content=html, headers=headers)
 
-    logger.info(f"📊 Displaying {len(user_files)} files for user {user.email}")
 
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "chain": user_files,
-            "current_user": user,
+def validate_upload_filename(raw_filename: str | None) -> tuple[str | None, JSONResponse | None]:
+    """Sanitize an uploaded filename, returning (filename, error_response)"""
+    if not raw_filename:
+        logger.warning("No file selected")
+        return None, JSONResponse(
+            status_code=400, content={"message": "No selected file"}
+        )
+
+    filename = secure_filename(raw_filename)
+    if not filename or ".." in filename or filename.startswith("/"):
+        logger.warning(f"Invalid filename attempted: {filename}")
+        return None, JSONResponse(
+            status_code=400, content={"message": "Invalid filename"}
+        )
+
+    if not allowed_file(filename):
+        logger.warning(f"File type not allowed: {filename}")
+        return None, JSONResponse(
+            status_code=400,
+            content={
+                "message": f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+            },
+        )
+
+    return filename, None
+
+
+async def find_duplicate_upload(
+    db: AsyncSession, user: User, filename: str
+) -> JSONResponse | None:
+    """Return a 409 response if the user already owns or is uploading this name"""
+    existing_file = await db.execute(
+        select(File).where((File.filename == filename) & (File.owner_email == user.email))
+    )
+    if existing_file.scalar_one_or_none():
+        logger.warning(f"User {user.email} already owns a file named {filename}")
+        return JSONResponse(
+            status_code=409,
+            content={
+                "message": f"You already own a file named '{filename}'. Please rename your file or upload a different one."
+            },
+        )
+
+    pending_job = await db.execute(
+        select(UploadJob.id).where(
+            (UploadJob.filename == filename)
+            & (UploadJob.owner_email == user.email)
+            & UploadJob.status.in_(PENDING_STATUSES)
+        )
+    )
+    if pending_job.first():
+        logger.warning(f"User {user.email} already has {filename} queued for upload")
+        return JSONResponse(
+            status_code=409,
+            content={
+                "message": f"'{filename}' is already being uploaded. Please wait for it to finish."
+            },
+        )
+    return None
+
+
+async def record_upload(
+    db: AsyncSession,
+    user: User,
+    filename: str,
+    ipfs_hash: str,
+    content_encoding: str | None = None,
+    object_key: str | None = None,
+    size: int | None = None,
+) -> JSONResponse:
+    """
+    Append the block and File row for a file that is already stored on IPFS
+
+    When the storage key is known it's added to the bucket inventory too, so
+    downloads find the object without scanning the bucket.
+    """
+    file_data = File(filename=filename, ipfs_hash=ipfs_hash, owner_email=user.email)
+    logger.info(f"Attempting to add file_data to database: {file_data.filename}")
+    db.add(file_data)
+    if content_encoding:
+        await db.merge(FileEncoding(ipfs_hash=ipfs_hash, codec=content_encoding))
+    if object_key is not None and size is not None:
+        await record_stored_object(db, object_key, ipfs_hash, size)
+    await db.commit()
+    await db.refresh(
+        file_data
+    )  # Refresh to get any database-generated defaults like id, uploaded_at
+    logger.info(
+        f"Successfully added file {file_data.filename} with ID {file_data.id} to database."
+    )
+
+    # Chained only after the commit, so a failed commit leaves no orphan block.
+    # The upload is recorded by now, so a failure here is logged, not returned
+    try:
+        new_block = blockchain.create_block(filename, ipfs_hash)
+        blockchain.save_to_file()
+        logger.info(f"⛓️ Block #{new_block.index} added to blockchain")
+    except Exception as e:
+        logger.error(f"❌ Could not add a block for {filename} ({ipfs_hash}): {e}")
+
+    listing_cache.invalidate(user.email)
+    logger.info(f"✅ File upload complete for user {user.email}")
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "message": f"File uploaded successfully! IPFS CID: {ipfs_hash}",
+            "ipfs_hash": ipfs_hash,
         },
     )
 
@@ -309,91 +594,312 @@ async def upload_file(
         logger.warning("No file part in request")
         return JSONResponse(status_code=400, content={"message": "No file part"})
 
-    if file.filename == "":
-        logger.warning("No file selected")
-        return JSONResponse(status_code=400, content={"message": "No selected file"})
-
-    filename = secure_filename(file.filename)
-    if not filename or ".." in filename or filename.startswith("/"):
-        logger.warning(f"Invalid filename attempted: {filename}")
-        return JSONResponse(status_code=400, content={"message": "Invalid filename"})
+    filename, error = validate_upload_filename(file.filename)
+    if error:
+        return error
 
-    if not allowed_file(filename):
-        logger.warning(f"File type not allowed: {filename}")
-        return JSONResponse(
-            status_code=400,
-            content={
-                "message": f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-            },
-        )
+    if settings.ASYNC_UPLOADS:
+        return await accept_upload(file, filename, current_user, db)
 
     file_path = os.path.join(settings.UPLOAD_FOLDER, filename)
 
     try:
         with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+            await asyncio.to_thread(shutil.copyfileobj, file.file, buffer, COPY_CHUNK)
         logger.info(f"📁 File saved temporarily: {filename}")
 
         # Check if a file with the same name already exists for the current user
-        existing_file = await db.execute(
-            select(File).where(
-                (File.filename == filename) & (File.owner_email == current_user.email)
-            )
-        )
-        if existing_file.scalar_one_or_none():
-            logger.warning(
-                f"User {current_user.email} already owns a file named {filename}"
+        duplicate = await find_duplicate_upload(db, current_user, filename)
+        if duplicate:
+            return duplicate
+
+        codec = object_key = size = None
+        if settings.CHUNKED_STORAGE:
+            ipfs_hash = await chunk_store.store_file(db, file_path)
+        else:
+            codec = await asyncio.to_thread(
+                maybe_compress_file, file_path, settings.STORAGE_COMPRESSION
             )
-            return JSONResponse(
-                status_code=409,
-                content={
-                    "message": f"You already own a file named '{filename}'. Please rename your file or upload a different one."
-                },
+            ipfs_hash = await asyncio.to_thread(
+                ipfs_client.upload_file, file_path, codec
             )
-
-        ipfs_hash = ipfs_client.upload_file(file_path)
+            object_key, size = filename, os.path.getsize(file_path)
         logger.info(f"☁️ File uploaded to IPFS: {filename}, CID: {ipfs_hash}")
 
-        new_block = blockchain.create_block(filename, ipfs_hash)
-        blockchain.save_to_file()
-        logger.info(f"⛓️ Block #{new_block.index} added to blockchain")
+        response = await record_upload(
+            db, current_user, filename, ipfs_hash, codec, object_key, size
+        )
+        # Logs rather than raises, as the upload is already recorded
+        preview_pipeline.submit(ipfs_hash, filename, file_path, codec)
+        return response
 
-        file_data = File(
-            filename=filename, ipfs_hash=ipfs_hash, owner_email=current_user.email
+    except Exception as e:
+        logger.error(f"❌ Error uploading file: {str(e)}")
+        traceback.print_exc()
+        await db.rollback()
+        return JSONResponse(
+            status_code=500, content={"message": f"Error uploading file: {str(e)}"}
         )
-        logger.info(f"Attempting to add file_data to database: {file_data.filename}")
-        db.add(file_data)
-        await db.commit()
-        await db.refresh(
-            file_data
-        )  # Refresh to get any database-generated defaults like id, uploaded_at
-        logger.info(
-            f"Successfully added file {file_data.filename} with ID {file_data.id} to database."
+
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logger.info(f"🧹 Temporary file cleaned up: {filename}")
+
+
+async def accept_upload(
+    file: UploadFile, filename: str, current_user: User, db: AsyncSession
+) -> JSONResponse:
+    """Stage an upload locally and hand it to the background pinning queue"""
+    duplicate = await find_duplicate_upload(db, current_user, filename)
+    if duplicate:
+        return duplicate
+
+    job_id = upload_queue.new_job_id()
+    staged_path = upload_queue.staging_path(job_id, filename)
+
+    try:
+        os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+        with open(staged_path, "wb") as buffer:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, buffer, COPY_CHUNK)
+        logger.info(f"📁 File staged for background upload: {filename}")
+
+        codec = None
+        if not settings.CHUNKED_STORAGE:
+            codec = await asyncio.to_thread(
+                maybe_compress_file, staged_path, settings.STORAGE_COMPRESSION
+            )
+
+        job = await upload_queue.enqueue(
+            db, job_id, filename, current_user.email, content_encoding=codec
         )
 
-        logger.info(f"✅ File upload complete for user {current_user.email}")
+    except Exception as e:
+        logger.error(f"❌ Error queueing upload: {str(e)}")
+        traceback.print_exc()
+        await db.rollback()
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        return JSONResponse(
+            status_code=500, content={"message": f"Error uploading file: {str(e)}"}
+        )
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": f"File accepted! Pinning {filename} to IPFS in the background.",
+            "job_id": job.id,
+            "status_url": f"/upload/jobs/{job.id}",
+        },
+    )
+
+
+@app.get("/upload/jobs/{job_id}")
+async def upload_job_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Report the progress of a background upload job"""
+    job = await db.get(UploadJob, job_id)
+    if not job or job.owner_email != current_user.email:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    content = {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "attempts": job.attempts,
+        "ipfs_hash": job.ipfs_hash,
+        "error": job.error,
+    }
+    if job.status == "done":
+        content["message"] = f"File uploaded successfully! IPFS CID: {job.ipfs_hash}"
+
+    return JSONResponse(status_code=200, content=content)
+
+
+@app.post("/upload/presign")
+async def presign_upload(
+    request: Request,
+    filename: str = Form(...),
+    size: int = Form(...),
+    current_user: User = Depends(get_current_user_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Issue a presigned Filebase PUT URL so the browser can upload directly"""
+    if not settings.DIRECT_TRANSFERS:
+        raise HTTPException(status_code=404, detail="Direct uploads are disabled")
+
+    filename, error = validate_upload_filename(filename)
+    if error:
+        return error
+
+    if size > settings.MAX_CONTENT_LENGTH:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    duplicate = await find_duplicate_upload(db, current_user, filename)
+    if duplicate:
+        return duplicate
+
+    # The bucket is shared, so each direct upload gets a key nobody else can
+    # be handed a URL for; the signed length stops the PUT exceeding `size`
+    key = f"direct/{uuid.uuid4().hex}/{filename}"
+    content_type, _, _ = describe_content(filename)
+    upload_url = ipfs_client.generate_upload_url(
+        key,
+        content_type=content_type,
+        content_length=size,
+        expires_in=settings.PRESIGNED_URL_EXPIRY,
+    )
+
+    # Remember which key this user may complete, so /upload/complete can't be
+    # used to claim somebody else's object
+    pending = request.session.get("pending_uploads", [])
+    request.session["pending_uploads"] = pending[-4:] + [key]
+
+    logger.info(f"🔏 Issued presigned upload for {key} to {current_user.email}")
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "upload_url": upload_url,
+            "key": key,
+            "headers": {"Content-Type": content_type},
+        },
+    )
 
+
+@app.post("/upload/complete")
+async def complete_upload(
+    request: Request,
+    key: str = Form(...),
+    current_user: User = Depends(get_current_user_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Record a direct upload once the browser has finished PUTting it to Filebase"""
+    if not settings.DIRECT_TRANSFERS:
+        raise HTTPException(status_code=404, detail="Direct uploads are disabled")
+
+    pending = request.session.get("pending_uploads", [])
+    if key not in pending:
+        logger.warning(f"Unknown direct upload completed by {current_user.email}: {key}")
         return JSONResponse(
-            status_code=200,
-            content={
-                "message": f"File uploaded successfully! IPFS CID: {ipfs_hash}",
-                "ipfs_hash": ipfs_hash,
-            },
+            status_code=400, content={"message": "No pending upload for this file"}
         )
 
+    filename = key.rsplit("/", 1)[-1]
+
+    try:
+        duplicate = await find_duplicate_upload(db, current_user, filename)
+        if duplicate:
+            return duplicate
+
+        ipfs_hash, size = await asyncio.to_thread(ipfs_client.stat_object, key)
+        if size > settings.MAX_CONTENT_LENGTH:
+            # Only the claimed size was checked before the browser sent bytes
+            await asyncio.to_thread(ipfs_client.delete, key)
+            request.session["pending_uploads"] = [k for k in pending if k != key]
+            logger.warning(f"🚫 Deleted oversized direct upload {key} ({size} bytes)")
+            raise HTTPException(status_code=413, detail="File too large")
+        if not ipfs_hash:
+            raise Exception("No CID returned from Filebase after upload")
+        logger.info(f"☁️ Direct upload confirmed on IPFS: {key}, CID: {ipfs_hash}")
+
+        response = await record_upload(
+            db, current_user, filename, ipfs_hash, object_key=key, size=size
+        )
+        request.session["pending_uploads"] = [k for k in pending if k != key]
+        return response
+
+    except HTTPException:
+        raise
+
     except Exception as e:
-        logger.error(f"❌ Error uploading file: {str(e)}")
+        logger.error(f"❌ Error completing direct upload: {str(e)}")
         traceback.print_exc()
         await db.rollback()
         return JSONResponse(
             status_code=500, content={"message": f"Error uploading file: {str(e)}"}
         )
 
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"🧹 Temporary file cleaned up: {filename}")
+
+def describe_content(filename: str) -> tuple[str, str, str]:
+    """Return (content_type, disposition, Content-Disposition header) for a filename"""
+    # Determine content type based on file extension. Include a sensible
+    # default and expand common renderable types so the browser can display
+    # them inline (open in new tab) instead of forcing a download.
+    file_ext = filename.lower().split(".")[-1] if "." in filename else ""
+    content_types = {
+        "pdf": "application/pdf",
+        "png": "image/png",
+        "jpg": "image/jpeg",
+        "jpeg": "image/jpeg",
+        "gif": "image/gif",
+        "mp4": "video/mp4",
+        "webm": "video/webm",
+        "mp3": "audio/mpeg",
+        "wav": "audio/wav",
+        "txt": "text/plain",
+        "html": "text/html",
+        "htm": "text/html",
+        "doc": "application/msword",
+        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "zip": "application/zip",
+    }
+
+    content_type = content_types.get(file_ext, "application/octet-stream")
+
+    # Decide whether to request inline display or attachment download.
+    # Browsers will render inline for images, pdf, text, html, audio and video
+    # when Content-Disposition is 'inline' and a supported media type is sent.
+    inline_types = (
+        "application/pdf",
+        "text/plain",
+        "text/html",
+    )
+
+    disposition = "attachment"
+    if (
+        content_type.startswith("image/")
+        or content_type.startswith("video/")
+        or content_type.startswith("audio/")
+        or content_type in inline_types
+    ):
+        disposition = "inline"
+
+    safe_name = secure_filename(filename) or f"file.{file_ext}"
+    encoded_name = url_quote(filename)
+
+    content_disposition = (
+        f"{disposition}; filename=\"{safe_name}\"; filename*=UTF-8''{encoded_name}"
+    )
+
+    return content_type, disposition, content_disposition
+
+
+async def confirm_inventory_key(
+    db: AsyncSession, key: str, ipfs_hash: str
+) -> str | None:
+    """
+    Check that an inventory key still holds a CID before serving it
+
+    A key can be overwritten after its row was written. On a mismatch the
+    row is corrected and None is returned, so the caller falls back to
+    finding the CID by scanning.
+    """
+    try:
+        current_cid, size = await asyncio.to_thread(ipfs_client.stat_object, key)
+    except Exception as e:
+        logger.warning(f"Inventory key {key} for {ipfs_hash} unreadable: {e}")
+        return None
+    if current_cid == ipfs_hash:
+        return key
+
+    logger.warning(f"Inventory key {key} now holds {current_cid}, not {ipfs_hash}")
+    await record_stored_object(db, key, current_cid, size)
+    await db.commit()
+    return None
 
 
 @app.get("/download")
@@ -419,75 +925,204 @@ async def download_file(
         file_record = records[0]
 
         filename = file_record.filename
-        file_content = ipfs_client.download_file(ipfs_hash)
-
-        if file_content is None:
-            raise HTTPException(status_code=404, detail="File not found on IPFS")
-
-        # Determine content type based on file extension. Include a sensible
-        # default and expand common renderable types so the browser can display
-        # them inline (open in new tab) instead of forcing a download.
-        file_ext = filename.lower().split(".")[-1] if "." in filename else ""
-        content_types = {
-            "pdf": "application/pdf",
-            "png": "image/png",
-            "jpg": "image/jpeg",
-            "jpeg": "image/jpeg",
-            "gif": "image/gif",
-            "mp4": "video/mp4",
-            "webm": "video/webm",
-            "mp3": "audio/mpeg",
-            "wav": "audio/wav",
-            "txt": "text/plain",
-            "html": "text/html",
-            "htm": "text/html",
-            "doc": "application/msword",
-            "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "zip": "application/zip",
-        }
-
-        content_type = content_types.get(file_ext, "application/octet-stream")
-
-        # Decide whether to request inline display or attachment download.
-        # Browsers will render inline for images, pdf, text, html, audio and video
-        # when Content-Disposition is 'inline' and a supported media type is sent.
-        inline_types = (
-            "application/pdf",
-            "text/plain",
-            "text/html",
-        )
-
-        disposition = "attachment"
-        if (
-            content_type.startswith("image/")
-            or content_type.startswith("video/")
-            or content_type.startswith("audio/")
-            or content_type in inline_types
-        ):
-            disposition = "inline"
 
-        safe_name = secure_filename(filename) or f"file.{file_ext}"
-        encoded_name = url_quote(filename)
+        manifest = await db.get(ChunkManifest, ipfs_hash)
+        if manifest:
+            # Stored as deduplicated chunks: reassemble while streaming
+            content_type, disposition, content_disposition = describe_content(filename)
+            headers = {
+                "Content-Disposition": content_disposition,
+                "Content-Length": str(manifest.size),
+            }
+            logger.info(
+                f"✅ Serving chunked file {filename} ({ipfs_hash}) as {content_type} with disposition={disposition}"
+            )
+            return StreamingResponse(
+                content=chunk_store.iter_file(manifest.manifest),
+                media_type=content_type,
+                headers=headers,
+            )
 
-        content_disposition = (
-            f"{disposition}; filename=\"{safe_name}\"; filename*=UTF-8''{encoded_name}"
+        # The bucket inventory maps CIDs to keys without scanning the bucket
+        key_result = await db.execute(
+            select(StoredObject.key).where(StoredObject.ipfs_hash == ipfs_hash).limit(1)
         )
+        object_key = key_result.scalar_one_or_none()
+        if object_key:
+            object_key = await confirm_inventory_key(db, object_key, ipfs_hash)
+
+        if settings.DIRECT_TRANSFERS:
+            # Hand the browser a presigned Filebase URL instead of proxying bytes
+            if not object_key:
+                file_info = await asyncio.to_thread(
+                    ipfs_client.get_file_info, ipfs_hash
+                )
+                object_key = file_info["key"] if file_info else None
+            if object_key:
+                content_type, _, content_disposition = describe_content(filename)
+                download_url = ipfs_client.generate_download_url(
+                    object_key,
+                    content_type=content_type,
+                    content_disposition=content_disposition,
+                    expires_in=settings.PRESIGNED_URL_EXPIRY,
+                )
+                logger.info(f"↪️ Redirecting download of {ipfs_hash} to Filebase")
+                return RedirectResponse(url=download_url, status_code=307)
+
+            logger.warning(
+                f"No Filebase object found for {ipfs_hash}, proxying download instead"
+            )
+
+        body = None
+        if object_key:
+            try:
+                content = await asyncio.to_thread(ipfs_client.get_object, object_key)
+                body = iter_chunks(content)
+            except Exception as e:
+                logger.warning(f"Inventory key {object_key} unreadable, scanning: {e}")
+        if body is None:
+            # Gateway downloads arrive as verified blocks. Fetch the first one
+            # now, so a CID no source can serve fails before headers are sent
+            chunks = ipfs_client.iter_download(ipfs_hash)
+            first = await asyncio.to_thread(next, chunks, b"")
+            body = itertools.chain([first], chunks)
+
+        content_type, disposition, content_disposition = describe_content(filename)
 
         headers = {"Content-Disposition": content_disposition}
 
+        encoding = await db.get(FileEncoding, ipfs_hash)
+        if encoding:
+            # Stored compressed: pass through if the client can decode it,
+            # otherwise decompress while streaming
+            headers["Vary"] = "Accept-Encoding"
+            if accepts_encoding(request.headers.get("accept-encoding"), encoding.codec):
+                headers["Content-Encoding"] = encoding.codec
+            else:
+                body = decompress_chunks(body, encoding.codec)
+
         logger.info(
             f"✅ Serving file {filename} ({ipfs_hash}) as {content_type} with disposition={disposition}"
         )
 
-        return StreamingResponse(
-            content=iter([file_content]), media_type=content_type, headers=headers
-        )
+        return StreamingResponse(content=body, media_type=content_type, headers=headers)
 
     except Exception as e:
         logger.error(f"❌ Error serving file {ipfs_hash}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error serving file: {str(e)}")
 
 
+@app.get("/preview/{ipfs_hash}")
+async def preview_file(
+    ipfs_hash: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
+    """Serve the cached thumbnail or first-page preview of a file"""
+    preview = await db.get(Preview, ipfs_hash)
+    if not preview:
+        raise HTTPException(status_code=404, detail="Preview not available")
+
+    # Previews never change for a given CID, so browsers may keep them forever
+    headers = {
+        "ETag": f'"{preview.preview_cid}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = await asyncio.to_thread(preview_pipeline.load, preview)
+    except Exception as e:
+        logger.error(f"❌ Error loading preview {ipfs_hash}: {str(e)}")
+        raise HTTPException(status_code=404, detail="Preview not available")
+
+    return Response(content=data, media_type=PREVIEW_MEDIA_TYPE, headers=headers)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def encode_search_cursor(file: File) -> str:
+    raw = json.dumps([file.uploaded_at.isoformat(), file.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[datetime, int]:
+    uploaded_at, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(uploaded_at), int(file_id)
+
+
+@app.get("/api/files/search")
+async def search_files(
+    q: str = "",
+    ext: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cid_prefix: str | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+    current_user: User = Depends(get_current_user_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Search the current user's files, newest first, with keyset pagination"""
+    limit = max(1, min(limit, 200))
+
+    query = select(File).where(File.owner_email == current_user.email)
+
+    if q.strip():
+        # Served by the trigram index on Postgres
+        query = query.where(
+            File.filename.ilike(f"%{_escape_like(q.strip())}%", escape="\\")
+        )
+    if ext:
+        query = query.where(
+            File.filename.ilike(f"%.{_escape_like(ext.lstrip('.'))}", escape="\\")
+        )
+    if since:
+        query = query.where(File.uploaded_at >= since)
+    if until:
+        query = query.where(File.uploaded_at < until)
+    if cid_prefix:
+        query = query.where(
+            File.ipfs_hash.like(f"{_escape_like(cid_prefix)}%", escape="\\")
+        )
+
+    if cursor:
+        try:
+            cursor_uploaded_at, cursor_id = decode_search_cursor(cursor)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(
+            tuple_(File.uploaded_at, File.id) < tuple_(cursor_uploaded_at, cursor_id)
+        )
+
+    # Fetch one extra row to know whether there is another page
+    query = query.order_by(File.uploaded_at.desc(), File.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    rows = result.scalars().all()
+
+    page = rows[:limit]
+    next_cursor = encode_search_cursor(page[-1]) if len(rows) > limit else None
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "results": [
+                {
+                    "id": f.id,
+                    "filename": f.filename,
+                    "ipfs_hash": f.ipfs_hash,
+                    "uploaded_at": timestamp_to_string(f.uploaded_at),
+                }
+                for f in page
+            ],
+            "next_cursor": next_cursor,
+        },
+    )
+
+
 @app.get("/validate")
 async def validate_blockchain(current_user: User = Depends(get_current_user_required)):
     """Validate blockchain integrity"""
@@ -529,3 +1164,15 @@ async def session_status(request: Request, db: AsyncSession = Depends(get_db)):
             status_code=401,
             content={"authenticated": False},
         )
+
+
+@app.get("/api/startup-report")
+async def startup_report():
+    """Report how long each cold-start phase took"""
+    return JSONResponse(status_code=200, content=startup_timer.report())
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Report transfer admission counters and queue depth"""
+    return JSONResponse(status_code=200, content={"admission": admission.stats()})
@@ -0,0 +1,247 @@
+# chunk_store.py - Content-defined chunking and chunk-level deduplication
+import asyncio
+import hashlib
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+from database import Chunk, ChunkManifest
+
+logger = logging.getLogger(__name__)
+
+def _insert_ignoring_conflicts(session, model, rows):
+    """Build a dialect-specific INSERT ... ON CONFLICT DO NOTHING"""
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    return insert(model).values(rows).on_conflict_do_nothing()
+
+
+# Gear table for the rolling hash. Derived from SHA-256 so chunk boundaries
+# are stable across processes and releases; changing it breaks dedup.
+GEAR = [
+    int.from_bytes(hashlib.sha256(i.to_bytes(2, "big")).digest()[:8], "big")
+    for i in range(256)
+]
+
+
+def chunk_boundaries(data, min_size, avg_size, max_size):
+    """
+    Split data into content-defined chunks using FastCDC with a gear hash
+
+    Boundaries depend only on nearby content, so an edit early in a file
+    leaves the chunks after it unchanged and they dedupe against the old
+    version.
+
+    Args:
+        data: Bytes to split
+        min_size, avg_size, max_size: Chunk size bounds
+
+    Returns:
+        list: (offset, length) tuples covering data
+    """
+    bits = max(2, avg_size.bit_length() - 1)
+    # Normalized chunking: a stricter mask before the average size and a
+    # looser one after it pulls chunk sizes towards the average
+    mask_strict = (1 << (bits + 1)) - 1
+    mask_loose = (1 << (bits - 1)) - 1
+    gear = GEAR
+    view = memoryview(data)
+
+    boundaries = []
+    offset = 0
+    total = len(data)
+    while offset < total:
+        remaining = total - offset
+        if remaining <= min_size:
+            boundaries.append((offset, remaining))
+            break
+
+        end = offset + min(remaining, max_size)
+        normal = offset + min(remaining, avg_size)
+        # Gear hash shifted right rather than left: each byte's contribution
+        # falls off the low bits after 64 steps, so no 64-bit masking is
+        # needed and the loop stays tight
+        h = 0
+        cut = end
+        # The first min_size bytes can never be a boundary, so skip hashing them
+        i = offset + min_size
+        for byte in view[i:normal]:
+            h = (h >> 1) + gear[byte]
+            i += 1
+            if not h & mask_strict:
+                cut = i
+                break
+        else:
+            for byte in view[i:end]:
+                h = (h >> 1) + gear[byte]
+                i += 1
+                if not h & mask_loose:
+                    cut = i
+                    break
+
+        boundaries.append((offset, cut - offset))
+        offset = cut
+
+    return boundaries
+
+
+class ChunkStore:
+    """
+    Stores files as manifests of deduplicated content-defined chunks.
+
+    Each unique chunk is pinned once under chunks/<sha256>. A file becomes a
+    JSON manifest listing its chunks, pinned under manifests/<sha256>; the
+    manifest's CID is what the File row records.
+    """
+
+    def __init__(
+        self,
+        ipfs_client,
+        avg_size=1024 * 1024,
+        min_size=None,
+        max_size=None,
+        upload_concurrency=4,
+        prefetch=4,
+    ):
+        self.ipfs_client = ipfs_client
+        self.avg_size = avg_size
+        self.min_size = min_size or avg_size // 4
+        self.max_size = max_size or avg_size * 4
+        self.upload_concurrency = upload_concurrency
+        self.prefetch = prefetch
+
+    async def store_file(self, session, file_path):
+        """
+        Chunk a file, pin the chunks not already stored, and pin its manifest
+
+        Adds Chunk and ChunkManifest rows to the session without committing,
+        so they land in the same transaction as the caller's File row.
+
+        Returns:
+            str: IPFS CID of the manifest
+        """
+        with open(file_path, "rb") as f:
+            data = f.read()
+
+        pieces = await asyncio.to_thread(self._split, data)
+        digests = list(dict.fromkeys(sha for sha, _, _ in pieces))
+
+        result = await session.execute(select(Chunk).where(Chunk.sha256.in_(digests)))
+        known = {chunk.sha256: chunk for chunk in result.scalars().all()}
+
+        missing = {}
+        for sha, offset, length in pieces:
+            if sha not in known and sha not in missing:
+                missing[sha] = (offset, length)
+
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def pin(sha, offset, length):
+            async with semaphore:
+                cid = await asyncio.to_thread(
+                    self.ipfs_client.put_object,
+                    f"chunks/{sha}",
+                    bytes(data[offset : offset + length]),
+                )
+            return Chunk(sha256=sha, ipfs_hash=cid, size=length)
+
+        new_chunks = await asyncio.gather(
+            *(pin(sha, offset, length) for sha, (offset, length) in missing.items())
+        )
+        for chunk in new_chunks:
+            known[chunk.sha256] = chunk
+        if new_chunks:
+            # A concurrent upload may have recorded the same chunk since the
+            # SELECT above; both pinned identical bytes, so either row will do
+            await session.execute(
+                _insert_ignoring_conflicts(
+                    session,
+                    Chunk,
+                    [
+                        {"sha256": c.sha256, "ipfs_hash": c.ipfs_hash, "size": c.size}
+                        for c in new_chunks
+                    ],
+                )
+            )
+
+        manifest = {
+            "version": 1,
+            "size": len(data),
+            "chunks": [
+                {"sha256": sha, "cid": known[sha].ipfs_hash, "size": length}
+                for sha, _, length in pieces
+            ],
+        }
+        manifest_json = json.dumps(manifest, separators=(",", ":"))
+        manifest_sha = hashlib.sha256(manifest_json.encode()).hexdigest()
+        manifest_cid = await asyncio.to_thread(
+            self.ipfs_client.put_object,
+            f"manifests/{manifest_sha}",
+            manifest_json.encode(),
+        )
+        await session.execute(
+            _insert_ignoring_conflicts(
+                session,
+                ChunkManifest,
+                [{"ipfs_hash": manifest_cid, "size": len(data), "manifest": manifest_json}],
+            )
+        )
+
+        logger.info(
+            f"🧩 Stored {file_path} as {len(pieces)} chunk(s), "
+            f"{len(new_chunks)} new, {len(data)} bytes, manifest {manifest_cid}"
+        )
+        return manifest_cid
+
+    def _split(self, data):
+        view = memoryview(data)
+        return [
+            (hashlib.sha256(view[offset : offset + length]).hexdigest(), offset, length)
+            for offset, length in chunk_boundaries(
+                data, self.min_size, self.avg_size, self.max_size
+            )
+        ]
+
+    def iter_file(self, manifest_json):
+        """
+        Reassemble a chunked file, fetching up to `prefetch` chunks ahead
+
+        Yields the file's bytes chunk by chunk, in order. Each chunk is
+        checked against its SHA-256 before it is yielded.
+        """
+        manifest = json.loads(manifest_json)
+        entries = manifest["chunks"]
+
+        with ThreadPoolExecutor(max_workers=self.prefetch) as pool:
+            pending = deque()
+            upcoming = iter(entries)
+
+            def submit_next():
+                entry = next(upcoming, None)
+                if entry is not None:
+                    pending.append((entry, pool.submit(self._fetch_chunk, entry)))
+
+            for _ in range(self.prefetch):
+                submit_next()
+
+            while pending:
+                entry, future = pending.popleft()
+                submit_next()
+                yield future.result()
+
+    def _fetch_chunk(self, entry):
+        try:
+            data = self.ipfs_client.get_object(f"chunks/{entry['sha256']}")
+        except Exception as e:
+            logger.warning(f"Chunk {entry['sha256']} not in bucket, trying IPFS: {e}")
+            data = self.ipfs_client.download_file(entry["cid"])
+
+        if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise Exception(f"Chunk {entry['sha256']} failed integrity check")
+        return data
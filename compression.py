@@ -0,0 +1,150 @@
+# compression.py - Transparent storage-side compression
+import gzip
+import logging
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip always works
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 64 * 1024
+CHUNK_SIZE = 256 * 1024
+# Only compress when the sample shrinks below this fraction of its size
+MIN_SAVING_RATIO = 0.9
+
+# Leading bytes of formats that are already compressed
+COMPRESSED_SIGNATURES = (
+    b"PK\x03\x04",  # zip, docx
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # jpeg
+    b"GIF8",
+    b"ID3",  # mp3
+    b"\x1f\x8b",  # gzip
+    b"(\xb5/\xfd",  # zstd
+)
+
+
+def available_codecs() -> tuple[str, ...]:
+    return ("gzip", "zstd") if zstandard else ("gzip",)
+
+
+def _compress_bytes(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def choose_codec(sample: bytes, preferred: str) -> str | None:
+    """
+    Decide whether content is worth compressing from a sample of its bytes
+
+    Args:
+        sample: Leading bytes of the file
+        preferred: Configured codec ("gzip", "zstd") or "off"
+
+    Returns:
+        str: Codec to use, or None to store the bytes as-is
+    """
+    if preferred == "off" or not sample:
+        return None
+
+    codec = preferred
+    if codec not in available_codecs():
+        logger.warning(f"Compression codec {codec} unavailable, using gzip")
+        codec = "gzip"
+
+    if sample.startswith(COMPRESSED_SIGNATURES) or b"ftyp" in sample[4:12]:
+        return None
+
+    if len(_compress_bytes(sample, codec)) > len(sample) * MIN_SAVING_RATIO:
+        return None
+
+    return codec
+
+
+def maybe_compress_file(file_path: str, preferred: str) -> str | None:
+    """
+    Compress a file in place if a sample of it compresses well
+
+    Returns:
+        str: Codec the file is now encoded with, or None if left untouched
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(SAMPLE_SIZE)
+
+    codec = choose_codec(sample, preferred)
+    if not codec:
+        return None
+
+    original_size = os.path.getsize(file_path)
+    tmp_path = f"{file_path}.{codec}.tmp"
+    try:
+        with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+            if codec == "zstd":
+                zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+            else:
+                with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6, mtime=0) as gz:
+                    while chunk := src.read(CHUNK_SIZE):
+                        gz.write(chunk)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(
+        f"🗜️ Compressed {os.path.basename(file_path)} with {codec}: "
+        f"{original_size} -> {os.path.getsize(file_path)} bytes"
+    )
+    return codec
+
+
+def decompress_chunks(chunks, codec: str):
+    """Decompress an iterable of encoded chunks, yielding plain chunks"""
+    if codec == "zstd":
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        for chunk in chunks:
+            out = decompressor.decompress(chunk)
+            if out:
+                yield out
+        return
+
+    # wbits=31 selects the gzip container
+    decompressor = zlib.decompressobj(wbits=31)
+    for chunk in chunks:
+        out = decompressor.decompress(chunk, CHUNK_SIZE)
+        if out:
+            yield out
+        while decompressor.unconsumed_tail:
+            out = decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE)
+            if out:
+                yield out
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def iter_chunks(content: bytes, size: int = CHUNK_SIZE):
+    for start in range(0, len(content), size):
+        yield content[start : start + size]
+
+
+def accepts_encoding(accept_encoding: str | None, codec: str) -> bool:
+    """Check whether an Accept-Encoding header allows the given codec"""
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() not in (codec, "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
@@ -1,9 +1,23 @@
 # database.py
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, DateTime, Integer, ForeignKey
+from sqlalchemy import (
+    DDL,
+    Index,
+    event,
+    String,
+    Text,
+    DateTime,
+    Integer,
+    BigInteger,
+    ForeignKey,
+    select,
+    delete,
+)
+from sqlalchemy.exc import DBAPIError
 from datetime import datetime
 from typing import Optional, AsyncGenerator
+import hashlib
 import logging
 from sqlalchemy.sql import func  # Added for default timestamps
 
@@ -36,12 +50,152 @@ class File(Base):
     owner_email: Mapped[str] = mapped_column(
         String(255), ForeignKey("users.email"), nullable=False, index=True
     )
-    uploaded_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    # Set in Python so SQLite stores it in the same format search cursors
+    # bind; func.now() rows compared wrongly against those and repeated
+    uploaded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
     owner: Mapped["User"] = relationship(
         back_populates="files", primaryjoin="File.owner_email == User.email"
     )
 
+    __table_args__ = (
+        # Keyset pagination of a user's files, newest first
+        Index("ix_files_owner_uploaded", "owner_email", "uploaded_at", "id"),
+        # CID prefix search; text_pattern_ops lets LIKE 'Qm...%' use it
+        Index(
+            "ix_files_owner_cid",
+            "owner_email",
+            "ipfs_hash",
+            postgresql_ops={"ipfs_hash": "text_pattern_ops"},
+        ),
+        # Substring filename search; SQLite falls back to scanning by owner
+        Index(
+            "ix_files_filename_trgm",
+            "filename",
+            postgresql_using="gin",
+            postgresql_ops={"filename": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+class FileEncoding(Base):
+    """Codec a stored CID was compressed with; CIDs without a row are raw"""
+
+    __tablename__ = "file_encodings"
+
+    ipfs_hash: Mapped[str] = mapped_column(String(255), primary_key=True)
+    codec: Mapped[str] = mapped_column(String(16), nullable=False)
+
+
+class Chunk(Base):
+    """Content-defined chunk pinned once and shared by every file containing it"""
+
+    __tablename__ = "chunks"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    ipfs_hash: Mapped[str] = mapped_column(String(255), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class ChunkManifest(Base):
+    """Ordered chunk list for a file stored in chunked mode, keyed by its CID"""
+
+    __tablename__ = "chunk_manifests"
+
+    ipfs_hash: Mapped[str] = mapped_column(String(255), primary_key=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    manifest: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+class StoredObject(Base):
+    """Bucket inventory row mapping an S3 key to its IPFS CID"""
+
+    __tablename__ = "stored_objects"
+
+    key: Mapped[str] = mapped_column(String(1024), primary_key=True)
+    ipfs_hash: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, index=True
+    )
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    last_modified: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    synced_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class Preview(Base):
+    """Thumbnail or first-page preview derived from a stored file"""
+
+    __tablename__ = "previews"
+
+    ipfs_hash: Mapped[str] = mapped_column(String(255), primary_key=True)
+    preview_cid: Mapped[str] = mapped_column(String(255), nullable=False)
+    key: Mapped[str] = mapped_column(String(1024), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+
+class UploadJob(Base):
+    """Upload staged on local disk, waiting to be pinned to IPFS"""
+
+    __tablename__ = "upload_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    owner_email: Mapped[str] = mapped_column(
+        String(255), ForeignKey("users.email"), nullable=False, index=True
+    )
+    staged_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="queued", index=True
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    content_encoding: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    ipfs_hash: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now()
+    )
+
+
+class SchemaMeta(Base):
+    """Key/value markers about the deployed schema"""
+
+    __tablename__ = "schema_meta"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(String(64), nullable=False)
+
+
+SCHEMA_VERSION_KEY = "schema_version"
+
+
+def schema_fingerprint() -> str:
+    """Hash every table, column and index so model changes bump the version"""
+    digest = hashlib.sha256()
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"{column.name}:{column.type}:{column.nullable}".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(f"{index.name}:{index.unique}".encode())
+    return digest.hexdigest()[:32]
+
+
+def _create_schema(sync_conn):
+    """Create missing tables, plus indexes added to tables that already exist"""
+    Base.metadata.create_all(sync_conn, checkfirst=True)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
 
 class DatabaseManager:
     def __init__(self):
@@ -50,23 +204,51 @@ class DatabaseManager:
 
     async def connect(self, database_url: str):
         """Initialize database connection"""
+        # SQLite (local runs, load tests) has no connection pool to size
+        pool_args = {}
+        if not database_url.startswith("sqlite"):
+            pool_args = {"pool_size": 10, "max_overflow": 20}
+
         self.engine = create_async_engine(
             database_url,
             echo=False,
             pool_pre_ping=True,
-            pool_size=10,
-            max_overflow=20,
+            **pool_args,
         )
         self.async_session_maker = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
 
-        # Create tables
+        # Create tables, unless the schema marker says they already match
+        fingerprint = schema_fingerprint()
+        if await self._deployed_schema_version() == fingerprint:
+            logger.info("PostgreSQL connected successfully, schema is up to date")
+            return
+
         async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all, checkfirst=True)
+            await conn.run_sync(_create_schema)
+            await conn.execute(
+                delete(SchemaMeta).where(SchemaMeta.key == SCHEMA_VERSION_KEY)
+            )
+            await conn.execute(
+                SchemaMeta.__table__.insert().values(
+                    key=SCHEMA_VERSION_KEY, value=fingerprint
+                )
+            )
 
         logger.info("PostgreSQL connected successfully and tables created")
 
+    async def _deployed_schema_version(self) -> Optional[str]:
+        """Read the schema marker, or None if it (or its table) is missing"""
+        try:
+            async with self.engine.connect() as conn:
+                result = await conn.execute(
+                    select(SchemaMeta.value).where(SchemaMeta.key == SCHEMA_VERSION_KEY)
+                )
+                return result.scalar_one_or_none()
+        except DBAPIError:
+            return None
+
     async def close(self):
         """Close database connection"""
         if self.engine:
@@ -99,4 +281,16 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 
 # Export models for easy import
-__all__ = ["db_manager", "get_db", "User", "File", "Base"]
\ No newline at end of file
+__all__ = [
+    "db_manager",
+    "get_db",
+    "User",
+    "File",
+    "FileEncoding",
+    "Chunk",
+    "ChunkManifest",
+    "StoredObject",
+    "Preview",
+    "UploadJob",
+    "Base",
+]
\ No newline at end of file
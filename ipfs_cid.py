@@ -0,0 +1,239 @@
+# ipfs_cid.py - CID parsing, block verification and UnixFS decoding
+"""
+Just enough of IPFS's content addressing to check untrusted bytes against
+a CID: multibase/CID parsing, multihash verification and the dag-pb and
+UnixFS protobufs, so a file can be walked block by block.
+"""
+import base64
+import hashlib
+from typing import NamedTuple
+
+# Multicodec codes
+RAW = 0x55
+DAG_PB = 0x70
+
+# Multihash function codes
+IDENTITY = 0x00
+SHA2_256 = 0x12
+
+HASHES = {
+    SHA2_256: hashlib.sha256,
+    0x13: hashlib.sha512,
+    0xB220: lambda: hashlib.blake2b(digest_size=32),
+}
+
+# UnixFS node types
+UNIXFS_RAW = 0
+UNIXFS_DIRECTORY = 1
+UNIXFS_FILE = 2
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+class InvalidBlock(Exception):
+    """Raised when a block doesn't match its CID or can't be decoded"""
+
+
+def _b58decode(text):
+    number = 0
+    for char in text:
+        index = BASE58_ALPHABET.find(char)
+        if index < 0:
+            raise ValueError(f"Invalid base58 character {char!r}")
+        number = number * 58 + index
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return b"\x00" * (len(text) - len(text.lstrip("1"))) + body
+
+
+def _b58encode(data):
+    number = int.from_bytes(data, "big")
+    chars = []
+    while number:
+        number, remainder = divmod(number, 58)
+        chars.append(BASE58_ALPHABET[remainder])
+    return "1" * (len(data) - len(data.lstrip(b"\x00"))) + "".join(reversed(chars))
+
+
+def _b32decode(text):
+    text = text.upper()
+    return base64.b32decode(text + "=" * (-len(text) % 8))
+
+
+def read_varint(data, offset=0):
+    """Decode an unsigned LEB128 varint, returning (value, next_offset)"""
+    value = shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+class CID(NamedTuple):
+    version: int
+    codec: int
+    hash_code: int
+    digest: bytes
+
+    def multihash(self):
+        return _varint(self.hash_code) + _varint(len(self.digest)) + self.digest
+
+    def __str__(self):
+        if self.version == 0:
+            return _b58encode(self.multihash())
+        data = _varint(1) + _varint(self.codec) + self.multihash()
+        return "b" + base64.b32encode(data).decode().lower().rstrip("=")
+
+
+def _parse_multihash(data, offset=0):
+    hash_code, offset = read_varint(data, offset)
+    length, offset = read_varint(data, offset)
+    digest = data[offset : offset + length]
+    if len(digest) != length:
+        raise ValueError("Truncated multihash")
+    return hash_code, digest, offset + length
+
+
+def decode_cid_bytes(data):
+    """Parse a binary CID, as found in dag-pb links"""
+    if len(data) == 34 and data[0] == SHA2_256 and data[1] == 32:
+        return CID(0, DAG_PB, SHA2_256, bytes(data[2:]))
+
+    version, offset = read_varint(data)
+    if version != 1:
+        raise ValueError(f"Unsupported CID version {version}")
+    codec, offset = read_varint(data, offset)
+    hash_code, digest, offset = _parse_multihash(data, offset)
+    return CID(1, codec, hash_code, digest)
+
+
+def parse_cid(text):
+    """
+    Parse a CID string
+
+    Supports CIDv0 (Qm...) and CIDv1 in base32 (b...), base58btc (z...)
+    and base16 (f...).
+
+    Raises:
+        ValueError: If the string isn't a CID this module understands
+    """
+    if len(text) == 46 and text.startswith("Qm"):
+        multihash = _b58decode(text)
+        hash_code, digest, _ = _parse_multihash(multihash)
+        return CID(0, DAG_PB, hash_code, digest)
+
+    prefix, body = text[:1], text[1:]
+    if prefix in ("b", "B"):
+        data = _b32decode(body)
+    elif prefix == "z":
+        data = _b58decode(body)
+    elif prefix in ("f", "F"):
+        data = bytes.fromhex(body)
+    else:
+        raise ValueError(f"Unsupported CID encoding: {text}")
+    return decode_cid_bytes(data)
+
+
+def raw_cid(sha256_digest):
+    """CIDv1 (raw codec, sha2-256 multihash) in base32, i.e. bafkrei..."""
+    return str(CID(1, RAW, SHA2_256, sha256_digest))
+
+
+def verify_block(cid, block):
+    """
+    Check a block's bytes against the multihash in its CID
+
+    Raises:
+        InvalidBlock: If the bytes don't hash to the CID
+        ValueError: If the CID uses a hash function we can't compute
+    """
+    if cid.hash_code == IDENTITY:
+        actual = bytes(block)
+    elif cid.hash_code in HASHES:
+        hasher = HASHES[cid.hash_code]()
+        hasher.update(block)
+        actual = hasher.digest()
+    else:
+        raise ValueError(f"Unsupported multihash function 0x{cid.hash_code:x}")
+
+    if actual != cid.digest:
+        raise InvalidBlock(f"Block does not match {cid}")
+
+
+def _fields(data):
+    """Iterate (field_number, value) over a protobuf message"""
+    offset = 0
+    while offset < len(data):
+        key, offset = read_varint(data, offset)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, offset = read_varint(data, offset)
+        elif wire_type == 2:
+            length, offset = read_varint(data, offset)
+            value = data[offset : offset + length]
+            if len(value) != length:
+                raise ValueError("Truncated protobuf field")
+            offset += length
+        elif wire_type == 1:
+            value, offset = data[offset : offset + 8], offset + 8
+        elif wire_type == 5:
+            value, offset = data[offset : offset + 4], offset + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield field, value
+
+
+def file_block_contents(cid, block):
+    """
+    Split a verified block of a UnixFS file into its own bytes and its children
+
+    Returns:
+        tuple: (bytes this block contributes, CIDs of child blocks in order)
+
+    Raises:
+        InvalidBlock: If the block isn't part of a UnixFS file
+    """
+    if cid.codec == RAW:
+        return bytes(block), []
+    if cid.codec != DAG_PB:
+        raise InvalidBlock(f"Unsupported codec 0x{cid.codec:x} for {cid}")
+
+    try:
+        links = []
+        node_data = None
+        for field, value in _fields(block):
+            if field == 2:  # PBNode.Links
+                link_hash = next(v for f, v in _fields(value) if f == 1)
+                links.append(decode_cid_bytes(link_hash))
+            elif field == 1:  # PBNode.Data
+                node_data = value
+
+        unixfs_type, content = UNIXFS_RAW, b""
+        for field, value in _fields(node_data or b""):
+            if field == 1:
+                unixfs_type = value
+            elif field == 2:
+                content = value
+    except (ValueError, StopIteration) as e:
+        raise InvalidBlock(f"Malformed dag-pb block {cid}: {e}")
+
+    if unixfs_type not in (UNIXFS_RAW, UNIXFS_FILE):
+        raise InvalidBlock(f"{cid} is not a file (UnixFS type {unixfs_type})")
+    # A file node's own data comes before its children's
+    return bytes(content), links
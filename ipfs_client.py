@@ -1,15 +1,19 @@
 # ipfs_client.py - S3 Compatible API Version with Download Support
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor
 import os
-import requests
 import logging
+import threading
+
+from storage import HEAD_WORKERS, StorageBackend, GatewayReader
 
 logger = logging.getLogger(__name__)
 
 
-class IPFSClient:
-    def __init__(self):
+class IPFSClient(StorageBackend):
+    supports_presigned_urls = True
+
+    def __init__(self, gateway_reader=None):
         # Get credentials from environment variables with hardcoded fallback
         access_key = os.getenv("FILEBASE_ACCESS_KEY")
         secret_key = os.getenv("FILEBASE_SECRET_KEY")
@@ -29,21 +33,223 @@ class IPFSClient:
                 "Please set it with your Filebase Secret Access Key."
             )
 
-        # Initialize S3 client with Filebase endpoint
-        self.s3_client = boto3.client(
-            "s3",
-            endpoint_url="https://s3.filebase.com",
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name="us-east-1",  # Filebase uses us-east-1
+        self._access_key = access_key
+        self._secret_key = secret_key
+
+        # Public gateways serve CIDs that aren't in our bucket
+        self.gateway_reader = gateway_reader or GatewayReader()
+
+        # boto3 and the S3 client are expensive to import and build, so they
+        # are created on first use (or by warm_up) instead of at import time
+        self._s3_client = None
+        self._s3_client_lock = threading.Lock()
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            with self._s3_client_lock:
+                if self._s3_client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    # Initialize S3 client with Filebase endpoint
+                    self._s3_client = boto3.client(
+                        "s3",
+                        endpoint_url="https://s3.filebase.com",
+                        aws_access_key_id=self._access_key,
+                        aws_secret_access_key=self._secret_key,
+                        region_name="us-east-1",  # Filebase uses us-east-1
+                        # SigV4 is needed for presigned URLs
+                        config=Config(
+                            signature_version="s3v4",
+                            max_pool_connections=HEAD_WORKERS,
+                        ),
+                    )
+        return self._s3_client
+
+    def warm_up(self):
+        """Build the S3 client ahead of the first request that needs it"""
+        return self.s3_client
+
+    @staticmethod
+    def _extract_cid(head_response):
+        """Pull the IPFS CID out of a head_object response"""
+        # Filebase returns the CID in the metadata
+        cid = head_response.get("Metadata", {}).get("cid")
+
+        if not cid:
+            # Fallback: try to get it from custom headers
+            cid = (
+                head_response.get("ResponseMetadata", {})
+                .get("HTTPHeaders", {})
+                .get("x-amz-meta-cid")
+            )
+
+        return cid
+
+    def get_cid(self, key):
+        """
+        Look up the IPFS CID Filebase assigned to an object
+
+        Args:
+            key: S3 object key in the bucket
+
+        Returns:
+            str: IPFS CID, or None if Filebase has not reported one yet
+        """
+        response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        return self._extract_cid(response)
+
+    def stat_object(self, key):
+        """
+        Look up an object's CID and size with a single head_object call
+
+        Returns:
+            tuple: (CID or None, size in bytes)
+        """
+        response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        return self._extract_cid(response), response["ContentLength"]
+
+    def put_object(self, key, data):
+        """
+        Store bytes under a specific key and return the CID Filebase assigns
+
+        Args:
+            key: S3 object key in the bucket
+            data: Bytes to store
+
+        Returns:
+            str: IPFS CID of the object
+        """
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+        cid = self.get_cid(key)
+        if not cid:
+            raise Exception(f"No CID returned from Filebase for {key}")
+        return cid
+
+    def delete(self, key):
+        """Remove an object from the bucket"""
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def get_object(self, key):
+        """
+        Read an object by key, without the bucket scan download_file needs
+
+        Args:
+            key: S3 object key in the bucket
+
+        Returns:
+            bytes: Object content
+        """
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        return response["Body"].read()
+
+    def iter_object_pages(self, prefix=None):
+        """
+        Yield the bucket listing one page (up to 1000 objects) at a time
+
+        Follows continuation tokens, so every object is seen, not just the
+        first 1000 keys.
+        """
+        params = {"Bucket": self.bucket_name}
+        if prefix:
+            params["Prefix"] = prefix
+
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**params):
+            yield page.get("Contents", [])
+
+    def get_cids(self, keys, workers=HEAD_WORKERS):
+        """
+        Look up CIDs for many keys with concurrent head_object calls
+
+        Returns:
+            dict: key -> CID, with None for keys that could not be read
+        """
+
+        def safe_get_cid(key):
+            try:
+                return self.get_cid(key)
+            except ClientError as e:
+                logger.warning(f"head_object failed for {key}: {e}")
+                return None
+
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(workers, len(keys))) as pool:
+            return dict(zip(keys, pool.map(safe_get_cid, keys)))
+
+    def find_object(self, ipfs_hash):
+        """
+        Scan the bucket for the object with a given CID
+
+        Returns:
+            dict: The object's list_objects_v2 entry, or None if not found
+        """
+        for page in self.iter_object_pages():
+            cids = self.get_cids([obj["Key"] for obj in page])
+            for obj in page:
+                if cids.get(obj["Key"]) == ipfs_hash:
+                    return obj
+        return None
+
+    def generate_upload_url(
+        self, key, content_type=None, content_length=None, expires_in=3600
+    ):
+        """
+        Create a presigned PUT URL so the browser can upload straight to Filebase
+
+        Args:
+            key: S3 object key the upload will be stored under
+            content_type: Content-Type the client must send with the PUT
+            content_length: Exact body size the PUT must have, if given
+            expires_in: Lifetime of the URL in seconds
+
+        Returns:
+            str: Presigned URL
+        """
+        params = {"Bucket": self.bucket_name, "Key": key}
+        if content_type:
+            params["ContentType"] = content_type
+        if content_length is not None:
+            params["ContentLength"] = content_length
+
+        return self.s3_client.generate_presigned_url(
+            "put_object", Params=params, ExpiresIn=expires_in
         )
 
-    def upload_file(self, file_path):
+    def generate_download_url(
+        self, key, content_type=None, content_disposition=None, expires_in=3600
+    ):
+        """
+        Create a presigned GET URL so the browser can download straight from Filebase
+
+        Args:
+            key: S3 object key to download
+            content_type: Content-Type Filebase should respond with
+            content_disposition: Content-Disposition Filebase should respond with
+            expires_in: Lifetime of the URL in seconds
+
+        Returns:
+            str: Presigned URL
+        """
+        params = {"Bucket": self.bucket_name, "Key": key}
+        if content_type:
+            params["ResponseContentType"] = content_type
+        if content_disposition:
+            params["ResponseContentDisposition"] = content_disposition
+
+        return self.s3_client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expires_in
+        )
+
+    def upload_file(self, file_path, content_encoding=None):
         """
         Upload a file to IPFS via Filebase S3 API
 
         Args:
             file_path: Path to the file to upload
+            content_encoding: Codec the file is compressed with, if any
 
         Returns:
             str: IPFS CID (Content Identifier) of the uploaded file
@@ -56,21 +262,18 @@ class IPFSClient:
             filename = os.path.basename(file_path)
 
             # Upload file to Filebase bucket
-            self.s3_client.upload_file(file_path, self.bucket_name, filename)
+            extra_args = None
+            if content_encoding:
+                extra_args = {
+                    "ContentEncoding": content_encoding,
+                    "Metadata": {"codec": content_encoding},
+                }
+            self.s3_client.upload_file(
+                file_path, self.bucket_name, filename, ExtraArgs=extra_args
+            )
 
             # Get the CID from the file metadata
-            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=filename)
-
-            # Filebase returns the CID in the metadata
-            cid = response.get("Metadata", {}).get("cid")
-
-            if not cid:
-                # Fallback: try to get it from custom headers
-                cid = (
-                    response.get("ResponseMetadata", {})
-                    .get("HTTPHeaders", {})
-                    .get("x-amz-meta-cid")
-                )
+            cid = self.get_cid(filename)
 
             if not cid:
                 raise Exception("No CID returned from Filebase after upload")
@@ -98,6 +301,25 @@ class IPFSClient:
         except Exception as e:
             raise Exception(f"Upload failed: {str(e)}")
 
+    def _download_from_bucket(self, ipfs_hash):
+        """Read the bucket object with a CID, or None if it isn't there"""
+        # Try to find the file by listing objects and matching CID
+        try:
+            logger.info(f"Attempting to download file with CID: {ipfs_hash}")
+
+            obj = self.find_object(ipfs_hash)
+            if obj:
+                # Found the matching file, download it
+                logger.info(f"Found matching file: {obj['Key']}")
+                return self.get_object(obj["Key"])
+
+            logger.warning(f"File with CID {ipfs_hash} not found in Filebase bucket")
+
+        except ClientError as e:
+            logger.warning(f"Error accessing Filebase bucket: {e}")
+
+        return None
+
     def download_file(self, ipfs_hash):
         """
         Download a file from IPFS using the CID
@@ -112,75 +334,31 @@ class IPFSClient:
             Exception: If download fails
         """
         try:
-            # Method 1: Try to download directly from Filebase using the CID as key
-            # First, try to find the file by listing objects and matching CID
-            try:
-                logger.info(f"Attempting to download file with CID: {ipfs_hash}")
-
-                # List all objects in the bucket
-                response = self.s3_client.list_objects_v2(Bucket=self.bucket_name)
-
-                if "Contents" in response:
-                    for obj in response["Contents"]:
-                        # Get metadata for each object
-                        head_response = self.s3_client.head_object(
-                            Bucket=self.bucket_name, Key=obj["Key"]
-                        )
-
-                        # Check if this object's CID matches
-                        obj_cid = head_response.get("Metadata", {}).get("cid")
-                        if not obj_cid:
-                            obj_cid = (
-                                head_response.get("ResponseMetadata", {})
-                                .get("HTTPHeaders", {})
-                                .get("x-amz-meta-cid")
-                            )
-
-                        if obj_cid == ipfs_hash:
-                            # Found the matching file, download it
-                            logger.info(f"Found matching file: {obj['Key']}")
-                            file_obj = self.s3_client.get_object(
-                                Bucket=self.bucket_name, Key=obj["Key"]
-                            )
-                            return file_obj["Body"].read()
-
-                logger.warning(
-                    f"File with CID {ipfs_hash} not found in Filebase bucket"
-                )
+            # Method 1: Try to download directly from Filebase
+            content = self._download_from_bucket(ipfs_hash)
+            if content is not None:
+                return content
 
-            except ClientError as e:
-                logger.warning(f"Error accessing Filebase bucket: {e}")
-
-            # Method 2: Try public IPFS gateways
-            logger.info("Attempting to download from public IPFS gateways")
-            gateways = [
-                f"https://ipfs.filebase.io/ipfs/{ipfs_hash}",
-                f"https://ipfs.io/ipfs/{ipfs_hash}",
-                f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}",
-                f"https://cloudflare-ipfs.com/ipfs/{ipfs_hash}",
-            ]
-
-            for gateway_url in gateways:
-                try:
-                    logger.info(f"Trying gateway: {gateway_url}")
-                    response = requests.get(gateway_url, timeout=30)
-                    if response.status_code == 200:
-                        logger.info(
-                            f"Successfully downloaded from gateway: {gateway_url}"
-                        )
-                        return response.content
-                except requests.exceptions.RequestException as e:
-                    logger.warning(f"Gateway {gateway_url} failed: {e}")
-                    continue
-
-            raise Exception(
-                f"Failed to download file with CID {ipfs_hash} from any source"
-            )
+            # Method 2: Try public IPFS gateways, verifying what they return
+            return self.gateway_reader.download_file(ipfs_hash)
 
         except Exception as e:
             logger.error(f"Error downloading file: {str(e)}")
             raise Exception(f"Download failed: {str(e)}")
 
+    def iter_download(self, ipfs_hash):
+        """
+        Like download_file, but streams gateway downloads block by block
+
+        Gateway bytes are only yielded once verified against the CID, so
+        nothing has to be buffered whole before it's served.
+        """
+        content = self._download_from_bucket(ipfs_hash)
+        if content is not None:
+            yield content
+        else:
+            yield from self.gateway_reader.iter_download(ipfs_hash)
+
     def get_file_info(self, ipfs_hash):
         """
         Get information about a file stored in IPFS
@@ -192,29 +370,14 @@ class IPFSClient:
             dict: File information including size, content type, etc.
         """
         try:
-            response = self.s3_client.list_objects_v2(Bucket=self.bucket_name)
-
-            if "Contents" in response:
-                for obj in response["Contents"]:
-                    head_response = self.s3_client.head_object(
-                        Bucket=self.bucket_name, Key=obj["Key"]
-                    )
-
-                    obj_cid = head_response.get("Metadata", {}).get("cid")
-                    if not obj_cid:
-                        obj_cid = (
-                            head_response.get("ResponseMetadata", {})
-                            .get("HTTPHeaders", {})
-                            .get("x-amz-meta-cid")
-                        )
-
-                    if obj_cid == ipfs_hash:
-                        return {
-                            "key": obj["Key"],
-                            "size": obj["Size"],
-                            "last_modified": obj["LastModified"],
-                            "cid": obj_cid,
-                        }
+            obj = self.find_object(ipfs_hash)
+            if obj:
+                return {
+                    "key": obj["Key"],
+                    "size": obj["Size"],
+                    "last_modified": obj["LastModified"],
+                    "cid": ipfs_hash,
+                }
 
             return None
 
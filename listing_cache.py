@@ -0,0 +1,76 @@
+# listing_cache.py - Per-user cache of rendered file listings
+from collections import OrderedDict
+import hashlib
+import secrets
+import threading
+
+
+class ListingCache:
+    """
+    Bounded LRU of rendered index pages, one entry per user.
+
+    Each user has a version counter that must be bumped (via invalidate)
+    whenever their file list changes. A cached page is only served while its
+    version is current, and the version also drives the page's ETag.
+
+    State is per process, which matches the single uvicorn worker we run.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._pages: OrderedDict[str, tuple[int, str]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        # Versions restart at zero with the process, so tag ETags with a
+        # per-boot nonce to stop them matching pages from a previous run
+        self._boot_id = secrets.token_hex(4)
+
+    def version(self, email: str) -> int:
+        return self._versions.get(email, 0)
+
+    def etag(self, email: str, version: int) -> str:
+        user_tag = hashlib.sha1(email.encode()).hexdigest()[:12]
+        return f'W/"{self._boot_id}-{user_tag}-{version}"'
+
+    def get(self, email: str, version: int) -> str | None:
+        """Return the cached page if it was rendered at this version"""
+        with self._lock:
+            entry = self._pages.get(email)
+            if entry is None or entry[0] != version:
+                return None
+            self._pages.move_to_end(email)
+            return entry[1]
+
+    def put(self, email: str, version: int, html: str) -> None:
+        """
+        Cache a page rendered from data read at `version`.
+
+        Pass the version captured *before* querying, so an upload that lands
+        mid-render leaves the entry stale instead of caching old data as new.
+        """
+        with self._lock:
+            self._pages[email] = (version, html)
+            self._pages.move_to_end(email)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def invalidate(self, email: str) -> None:
+        """Bump the user's version after their file list changes"""
+        with self._lock:
+            self._versions[email] = self._versions.get(email, 0) + 1
+            self._pages.pop(email, None)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
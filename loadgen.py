@@ -0,0 +1,519 @@
+# loadgen.py - Open-loop load generator for the whole app
+"""
+Drives realistic mixed traffic through the real app and reports how it copes:
+logins, index page loads, session-status polls, uploads of assorted sizes
+and downloads of popular CIDs.
+
+The app runs inside this process, either behind an in-memory ASGI transport
+or served by uvicorn on localhost. Google OAuth is faked so /auth logs in
+synthetic users, and storage uses the local backend in a scratch folder
+instead of Filebase. Without --database-url a scratch SQLite database is
+used, which needs aiosqlite installed.
+
+    python loadgen.py [--mode asgi|http] [--scenario mixed] [--duration 30]
+                      [--multipliers 1,2,4] [--json report.json]
+
+Requests arrive open-loop (Poisson arrivals at the scenario's rates) whether
+or not earlier ones have finished, and latency is measured from when each
+request was due, so a saturated server shows up as growing latency instead
+of a politely slowed-down client. Step up --multipliers to find the rate at
+which latency and errors take off.
+
+Peak RSS is sampled for this process, which holds the app and the client.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Arrivals per second of each operation, before --multipliers
+SCENARIOS = {
+    "browse": {"login": 0.5, "index": 10, "session_status": 20},
+    "mixed": {"login": 1, "index": 5, "session_status": 10, "upload": 2, "download": 5},
+    "uploads": {"session_status": 5, "upload": 8},
+    "downloads": {"session_status": 5, "download": 20},
+}
+
+# Statuses that count as success for each operation
+EXPECTED_STATUS = {
+    "login": {302},
+    "index": {200, 304},
+    "session_status": {200},
+    "upload": {200, 202},
+    "download": {200},
+}
+
+SEED_FILE_SIZE = 64 * 1024
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 * 1024, "B": 1}
+
+
+def parse_size(text):
+    """Parse a size such as 256KB or 4MB into bytes"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text)
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No /proc: fall back to the lifetime peak (KB on Linux, bytes on macOS)
+        import resource
+        import sys
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class OpStats:
+    """Latencies and outcomes for one operation in one scenario run"""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+    def record(self, latency, status, ok):
+        self.latencies.append(latency)
+        self.statuses[str(status)] += 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "requests": count,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "p50_ms": ms(percentile(latencies, 0.50)),
+            "p90_ms": ms(percentile(latencies, 0.90)),
+            "p99_ms": ms(percentile(latencies, 0.99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+            "statuses": dict(self.statuses),
+        }
+
+
+class VirtualUser:
+    def __init__(self, number, client):
+        self.number = number
+        self.client = client  # Holds this user's session cookie
+        self.etag = None
+
+
+class LoadGenerator:
+    """
+    Runs scenarios against one app instance.
+
+    Each virtual user has its own HTTP client, and so its own session, on a
+    shared transport.
+    """
+
+    def __init__(
+        self,
+        make_client,
+        users=20,
+        upload_sizes=(16 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024),
+        seed_files=20,
+        max_inflight=1000,
+        seed=0,
+    ):
+        self.make_client = make_client
+        self.user_count = users
+        self.upload_sizes = upload_sizes
+        self.seed_files = seed_files
+        self.max_inflight = max_inflight
+        self.rng = random.Random(seed)
+
+        self.users: list[VirtualUser] = []
+        self.popular_cids: list[str] = []
+        self.cid_weights: list[float] = []
+        # One random blob per size; uploads prefix it with a unique id
+        self._blobs = {
+            size: os.urandom(size) for size in {*upload_sizes, SEED_FILE_SIZE}
+        }
+
+    async def setup(self):
+        """Log every virtual user in and upload the files downloads will hit"""
+        for number in range(self.user_count):
+            user = VirtualUser(number, self.make_client())
+            response = await user.client.get("/auth", params={"user": number})
+            if response.status_code != 302:
+                raise RuntimeError(f"Login failed with {response.status_code}")
+            self.users.append(user)
+
+        uploader = self.users[0]
+        for _ in range(self.seed_files):
+            cid = await self._seed_upload(uploader)
+            if cid:
+                self.popular_cids.append(cid)
+        if self.seed_files and not self.popular_cids:
+            raise RuntimeError("Could not upload any files to download")
+
+        # Zipf-like popularity: the first files are fetched far more often
+        self.cid_weights = [1 / (rank + 1) for rank in range(len(self.popular_cids))]
+
+    async def close(self):
+        for user in self.users:
+            await user.client.aclose()
+
+    def _upload_form(self, size):
+        """A uniquely named file of `size` bytes with unique content"""
+        filename = f"loadgen-{uuid.uuid4().hex}.txt"
+        payload = uuid.uuid4().bytes + self._blobs[size][: size - 16]
+        return {"file": (filename, payload, "text/plain")}
+
+    async def _seed_upload(self, user):
+        """Upload a file for downloads to fetch, returning its CID"""
+        response = await user.client.post(
+            "/upload", files=self._upload_form(SEED_FILE_SIZE)
+        )
+        if response.status_code == 202:
+            status_url = response.json()["status_url"]
+            while True:
+                job = (await user.client.get(status_url)).json()
+                if job["status"] in ("done", "failed"):
+                    return job["ipfs_hash"]
+                await asyncio.sleep(0.1)
+        if response.status_code == 200:
+            return response.json()["ipfs_hash"]
+        return None
+
+    async def _request(self, op):
+        user = self.rng.choice(self.users)
+        client = user.client
+
+        if op == "login":
+            return await client.get("/auth", params={"user": user.number})
+        if op == "index":
+            # Revalidate like a browser that has the page cached
+            headers = {"If-None-Match": user.etag} if user.etag else {}
+            response = await client.get("/", headers=headers)
+            user.etag = response.headers.get("etag", user.etag)
+            return response
+        if op == "session_status":
+            return await client.get("/api/session-status")
+        if op == "upload":
+            size = self.rng.choice(self.upload_sizes)
+            return await client.post("/upload", files=self._upload_form(size))
+        if op == "download":
+            cid = self.rng.choices(self.popular_cids, self.cid_weights)[0]
+            return await client.get("/download", params={"ipfs_hash": cid})
+        raise ValueError(f"Unknown operation {op}")
+
+    async def run_scenario(self, name, rates, duration):
+        """
+        Offer Poisson arrivals at the given per-operation rates for `duration` seconds
+
+        Returns:
+            dict: Throughput, latency percentiles and errors per operation,
+            plus dropped arrivals and peak RSS for the whole run
+        """
+        rates = {op: rate for op, rate in rates.items() if rate > 0}
+        if "download" in rates and not self.popular_cids:
+            raise RuntimeError("Scenario downloads files but none were seeded")
+
+        ops = list(rates)
+        weights = [rates[op] for op in ops]
+        total_rate = sum(weights)
+        stats = {op: OpStats() for op in ops}
+        tasks = set()
+        dropped = 0
+        peak_rss = current_rss()
+        loop = asyncio.get_running_loop()
+
+        async def fire(op, due):
+            try:
+                response = await self._request(op)
+                status = response.status_code
+                ok = status in EXPECTED_STATUS[op]
+            except Exception as e:
+                logger.debug(f"{op} failed: {e}")
+                status, ok = "exception", False
+            stats[op].record(loop.time() - due, status, ok)
+
+        async def sample_rss():
+            nonlocal peak_rss
+            while True:
+                peak_rss = max(peak_rss, current_rss())
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.create_task(sample_rss())
+        started = loop.time()
+        deadline = started + duration
+        due = started
+
+        while True:
+            due += self.rng.expovariate(total_rate)
+            if due >= deadline:
+                break
+            # Sleep until the arrival is due; when behind, fire at once
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if len(tasks) >= self.max_inflight:
+                dropped += 1
+                continue
+            op = self.rng.choices(ops, weights)[0]
+            task = asyncio.create_task(fire(op, due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = loop.time() - started
+        sampler.cancel()
+        peak_rss = max(peak_rss, current_rss())
+
+        total = sum(len(s.latencies) for s in stats.values())
+        errors = sum(s.errors for s in stats.values())
+        return {
+            "scenario": name,
+            "offered_rps": round(total_rate, 2),
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "dropped": dropped,
+            "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+            "operations": {op: s.summary(elapsed) for op, s in stats.items()},
+        }
+
+
+def prepare_environment(workdir, storage, database_url):
+    """Point the app at scratch storage and a fake Google app before it's imported"""
+    os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+    os.environ["LOCAL_STORAGE_PATH"] = os.path.join(workdir, "store")
+    os.environ["STORAGE_BACKEND"] = storage
+    os.environ["DIRECT_TRANSFERS"] = "false"
+    os.environ["DATABASE_URL"] = database_url or (
+        f"sqlite+aiosqlite:///{os.path.join(workdir, 'loadgen.db')}"
+    )
+    for name, value in (
+        ("GOOGLE_CLIENT_ID", "loadgen"),
+        ("GOOGLE_CLIENT_SECRET", "loadgen"),
+        ("GOOGLE_REDIRECT_URI", "http://localhost/auth"),
+    ):
+        os.environ.setdefault(name, value)
+
+
+def load_app(verbose=False):
+    """Import the app and fake the Google OAuth token exchange"""
+    import app as app_module
+
+    async def fake_authorize_access_token(request):
+        number = request.query_params.get("user", "0")
+        return {
+            "userinfo": {
+                "sub": f"loadgen-{number}",
+                "email": f"loadgen{number}@example.com",
+                "name": f"Load User {number}",
+            }
+        }
+
+    app_module.oauth.google.authorize_access_token = fake_authorize_access_token
+
+    if not verbose:
+        # Per-request INFO logging would dominate the numbers
+        logging.getLogger().setLevel(logging.WARNING)
+    return app_module.app
+
+
+async def run_scenarios(generator, args):
+    reports = []
+    await generator.setup()
+    try:
+        for name in args.scenario:
+            for multiplier in args.multipliers:
+                rates = {op: rate * multiplier for op, rate in SCENARIOS[name].items()}
+                label = name if multiplier == 1 else f"{name} x{multiplier:g}"
+                print(f"▶️ Running {label} for {args.duration:g}s...", flush=True)
+                report = await generator.run_scenario(label, rates, args.duration)
+                print(format_report(report), flush=True)
+                reports.append(report)
+    finally:
+        await generator.close()
+    return reports
+
+
+async def run_asgi(args, app):
+    """Drive the app through httpx's in-memory ASGI transport"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+
+    def make_client():
+        return httpx.AsyncClient(
+            transport=transport, base_url="http://loadgen", timeout=args.timeout
+        )
+
+    generator = LoadGenerator(
+        make_client,
+        users=args.users,
+        upload_sizes=args.upload_sizes,
+        seed_files=args.seed_files,
+        max_inflight=args.max_inflight,
+        seed=args.seed,
+    )
+    # httpx's ASGI transport doesn't send lifespan events, so run startup here
+    async with app.router.lifespan_context(app):
+        return await run_scenarios(generator, args)
+
+
+def run_http(args, app):
+    """Serve the app with uvicorn on localhost and drive it over real sockets"""
+    import httpx
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    async def drive():
+        limits = httpx.Limits(max_connections=args.max_inflight)
+        transport = httpx.AsyncHTTPTransport(limits=limits)
+
+        def make_client():
+            return httpx.AsyncClient(
+                transport=transport,
+                base_url=f"http://127.0.0.1:{port}",
+                timeout=args.timeout,
+            )
+
+        generator = LoadGenerator(
+            make_client,
+            users=args.users,
+            upload_sizes=args.upload_sizes,
+            seed_files=args.seed_files,
+            max_inflight=args.max_inflight,
+            seed=args.seed,
+        )
+        try:
+            return await run_scenarios(generator, args)
+        finally:
+            await transport.aclose()
+
+    try:
+        return asyncio.run(drive())
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def format_report(report):
+    lines = [
+        f"📈 {report['scenario']}: {report['requests']} requests in {report['duration_s']}s "
+        f"({report['throughput_rps']}/s of {report['offered_rps']}/s offered), "
+        f"errors {report['error_rate']:.2%}, dropped {report['dropped']}, "
+        f"peak RSS {report['peak_rss_mb']} MB",
+        f"   {'operation':<15}{'reqs':>7}{'rps':>9}{'err':>8}"
+        f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for op, s in report["operations"].items():
+        lines.append(
+            f"   {op:<15}{s['requests']:>7}{s['throughput_rps']:>9}{s['error_rate']:>8.2%}"
+            f"{s['p50_ms'] or '-':>10}{s['p90_ms'] or '-':>10}"
+            f"{s['p99_ms'] or '-':>10}{s['max_ms'] or '-':>10}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app in-process")
+    parser.add_argument("--mode", choices=("asgi", "http"), default="asgi")
+    parser.add_argument(
+        "--scenario",
+        choices=sorted(SCENARIOS),
+        action="append",
+        help="Scenario to run, may be repeated (default: mixed)",
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per run")
+    parser.add_argument(
+        "--multipliers",
+        type=lambda text: [float(m) for m in text.split(",")],
+        default=[1.0],
+        help="Comma-separated rate multipliers to step through, e.g. 1,2,4,8",
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument(
+        "--upload-sizes",
+        type=lambda text: tuple(parse_size(s) for s in text.split(",")),
+        default="16KB,256KB,1MB,4MB",
+    )
+    parser.add_argument("--seed-files", type=int, default=20)
+    parser.add_argument("--max-inflight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=0, help="Port for --mode http")
+    parser.add_argument(
+        "--storage",
+        choices=("local", "tiered", "filebase"),
+        default="local",
+        help="Storage backend; tiered and filebase use real Filebase credentials",
+    )
+    parser.add_argument(
+        "--database-url", help="Database to use instead of a scratch SQLite file"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the reports to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch folder")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's logs")
+    args = parser.parse_args()
+    args.scenario = args.scenario or ["mixed"]
+
+    logging.basicConfig(level=logging.INFO)
+    workdir = tempfile.mkdtemp(prefix="cloudsend-loadgen-")
+    prepare_environment(workdir, args.storage, args.database_url)
+    try:
+        app = load_app(args.verbose)
+        if args.mode == "asgi":
+            reports = asyncio.run(run_asgi(args, app))
+        else:
+            reports = run_http(args, app)
+    finally:
+        if args.keep:
+            print(f"📁 Scratch data kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
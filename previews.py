@@ -0,0 +1,195 @@
+# previews.py - Thumbnail and first-page preview derivation
+import asyncio
+import functools
+import importlib.util
+import io
+import logging
+import os
+import shutil
+
+from compression import decompress_chunks
+from database import db_manager, Preview
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+PDF_EXTENSIONS = {"pdf"}
+
+PREVIEW_MEDIA_TYPE = "image/webp"
+
+
+def _extension(filename):
+    return filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+
+
+@functools.cache
+def _installed(*modules):
+    """Whether any of the modules is importable, without importing it"""
+    return any(importlib.util.find_spec(module) for module in modules)
+
+
+def can_preview(filename):
+    """Whether a preview can be derived for this filename with what's installed"""
+    # Pillow and PyMuPDF are slow to import, so they're only checked for here
+    # and imported when a preview is actually rendered
+    ext = _extension(filename)
+    if not _installed("PIL"):
+        return False
+    return ext in IMAGE_EXTENSIONS or (
+        ext in PDF_EXTENSIONS and _installed("pymupdf", "fitz")
+    )
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+
+def render_preview(data, filename, max_size=256, quality=75):
+    """
+    Render a small WebP thumbnail of an image or a PDF's first page
+
+    Returns:
+        bytes: Encoded preview, or None if the file can't be previewed
+    """
+    from PIL import Image
+
+    ext = _extension(filename)
+
+    if ext in PDF_EXTENSIONS:
+        pymupdf = _import_pymupdf()
+        with pymupdf.open(stream=data, filetype="pdf") as doc:
+            if not doc.page_count:
+                return None
+            page = doc[0]
+            zoom = max_size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom))
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(io.BytesIO(data))
+        # draft() lets JPEG decode at reduced scale, far cheaper than full size
+        image.draft("RGB", (max_size, max_size))
+        image.seek(0)  # First frame of animated GIFs
+
+    image.thumbnail((max_size, max_size))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    out = io.BytesIO()
+    image.save(out, format="WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+def _render_pending(path, filename, content_encoding, max_size):
+    """Read, decode and render a set-aside upload, returning (its size, preview)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if content_encoding:
+        data = b"".join(decompress_chunks([data], content_encoding))
+    return len(data), render_preview(data, filename, max_size)
+
+
+class PreviewPipeline:
+    """
+    Derives previews in the background after uploads are recorded.
+
+    Previews are pinned next to the original as previews/<cid>.webp and kept
+    in a local cache folder, from which /preview serves them.
+    """
+
+    def __init__(self, ipfs_client, cache_folder, max_size=256, concurrency=1):
+        self.ipfs_client = ipfs_client
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        os.makedirs(os.path.join(cache_folder, "pending"), exist_ok=True)
+
+    def cache_path(self, ipfs_hash):
+        return os.path.join(self.cache_folder, f"{ipfs_hash}.webp")
+
+    def submit(self, ipfs_hash, filename, source_path, content_encoding=None):
+        """
+        Queue preview generation for a freshly uploaded file
+
+        The source is hard-linked (or copied) aside first, so the caller can
+        delete its temporary file straight away.
+        """
+        if not can_preview(filename) or not os.path.exists(source_path):
+            return
+
+        pending_path = os.path.join(self.cache_folder, "pending", ipfs_hash)
+        try:
+            os.link(source_path, pending_path)
+        except FileExistsError:
+            return
+        except OSError:
+            # The upload is already recorded; a missing preview mustn't fail it
+            try:
+                shutil.copyfile(source_path, pending_path)
+            except OSError as e:
+                logger.warning(f"Could not set {filename} aside for a preview: {e}")
+                return
+
+        task = asyncio.create_task(
+            self._generate(ipfs_hash, filename, pending_path, content_encoding)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _generate(self, ipfs_hash, filename, pending_path, content_encoding):
+        try:
+            async with self._semaphore:
+                source_size, preview = await asyncio.to_thread(
+                    _render_pending,
+                    pending_path,
+                    filename,
+                    content_encoding,
+                    self.max_size,
+                )
+                if not preview:
+                    return
+
+                key = f"previews/{ipfs_hash}.webp"
+                preview_cid = await asyncio.to_thread(
+                    self.ipfs_client.put_object, key, preview
+                )
+
+                with open(self.cache_path(ipfs_hash), "wb") as f:
+                    f.write(preview)
+
+                async with db_manager.async_session_maker() as session:
+                    await session.merge(
+                        Preview(
+                            ipfs_hash=ipfs_hash,
+                            preview_cid=preview_cid,
+                            key=key,
+                            size=len(preview),
+                        )
+                    )
+                    await session.commit()
+
+                logger.info(
+                    f"🖼️ Preview for {filename} ({ipfs_hash}): {source_size} -> {len(preview)} bytes"
+                )
+
+        except Exception as e:
+            logger.warning(f"Preview generation failed for {filename}: {e}")
+        finally:
+            if os.path.exists(pending_path):
+                os.remove(pending_path)
+
+    def load(self, preview):
+        """Read a stored preview, from the local cache or else from storage"""
+        path = self.cache_path(preview.ipfs_hash)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        data = self.ipfs_client.get_object(preview.key)
+        with open(path, "wb") as f:
+            f.write(data)
+        return data
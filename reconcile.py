@@ -0,0 +1,214 @@
+# reconcile.py - Bucket inventory and File/storage reconciliation
+"""
+Walks the whole Filebase bucket (or whichever STORAGE_BACKEND is set) and
+keeps the stored_objects table in sync with it, then reports File rows
+whose CIDs are not in the bucket.
+
+Run once from the command line:
+
+    python reconcile.py [--full] [--workers N]
+
+or on a schedule inside the app by setting RECONCILE_INTERVAL (seconds).
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import select, delete
+
+from database import db_manager, File, StoredObject
+from storage import HEAD_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def _naive_utc(dt):
+    """Convert S3's timezone-aware timestamps for our naive DateTime columns"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _upsert_statement(session, rows):
+    """Build a dialect-specific INSERT ... ON CONFLICT DO UPDATE for stored_objects"""
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(StoredObject).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[StoredObject.key],
+        set_={
+            column: stmt.excluded[column]
+            for column in ("ipfs_hash", "size", "last_modified", "synced_at")
+        },
+    )
+
+
+async def record_stored_object(session, key, ipfs_hash, size):
+    """
+    Upsert the inventory row for an object the app just wrote
+
+    Doesn't commit, so the row lands in the caller's transaction. The next
+    reconcile run still re-reads the key, since LastModified won't match.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    row = {
+        "key": key,
+        "ipfs_hash": ipfs_hash,
+        "size": size,
+        "last_modified": now,
+        "synced_at": now,
+    }
+    await session.execute(_upsert_statement(session, [row]))
+
+
+async def reconcile(session, ipfs_client, full=False, workers=HEAD_WORKERS):
+    """
+    Sync the bucket inventory and find File rows missing from storage
+
+    Every page of the listing is read, but head_object is only called for
+    keys that are new or whose LastModified changed since the last run,
+    unless `full` is set.
+
+    Returns:
+        dict: Counts of what changed plus the File rows with missing CIDs
+    """
+    started = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    result = await session.execute(
+        select(StoredObject.key, StoredObject.last_modified, StoredObject.ipfs_hash)
+    )
+    known = {key: (last_modified, cid) for key, last_modified, cid in result.all()}
+
+    seen = set()
+    scanned = updated = 0
+    pages = ipfs_client.iter_object_pages()
+
+    while True:
+        page = await asyncio.to_thread(next, pages, None)
+        if page is None:
+            break
+
+        changed = []
+        for obj in page:
+            key = obj["Key"]
+            seen.add(key)
+            last_modified = _naive_utc(obj["LastModified"])
+            previous = known.get(key)
+            if (
+                full
+                or previous is None
+                or previous[1] is None
+                or previous[0] != last_modified
+            ):
+                changed.append((key, obj["Size"], last_modified))
+        scanned += len(page)
+
+        if not changed:
+            continue
+
+        cids = await asyncio.to_thread(
+            ipfs_client.get_cids, [key for key, _, _ in changed], workers
+        )
+        rows = [
+            {
+                "key": key,
+                "ipfs_hash": cids.get(key),
+                "size": size,
+                "last_modified": last_modified,
+                "synced_at": started,
+            }
+            for key, size, last_modified in changed
+        ]
+        await session.execute(_upsert_statement(session, rows))
+        await session.commit()
+        updated += len(rows)
+        logger.info(f"🔄 Inventory: {scanned} scanned, {updated} updated")
+
+    vanished = [key for key in known if key not in seen]
+    for start in range(0, len(vanished), 1000):
+        await session.execute(
+            delete(StoredObject).where(
+                StoredObject.key.in_(vanished[start : start + 1000])
+            )
+        )
+    await session.commit()
+
+    stored_cids = select(StoredObject.ipfs_hash).where(
+        StoredObject.ipfs_hash.is_not(None)
+    )
+    missing_result = await session.execute(
+        select(File.id, File.filename, File.owner_email, File.ipfs_hash).where(
+            File.ipfs_hash.not_in(stored_cids)
+        )
+    )
+    missing = [
+        {"id": id_, "filename": filename, "owner_email": owner, "ipfs_hash": cid}
+        for id_, filename, owner, cid in missing_result.all()
+    ]
+
+    for row in missing:
+        logger.warning(
+            f"⚠️ File #{row['id']} {row['filename']} ({row['ipfs_hash']}) is not in the bucket"
+        )
+    logger.info(
+        f"✅ Reconciled {scanned} object(s): {updated} updated, "
+        f"{len(vanished)} removed, {len(missing)} file(s) missing from storage"
+    )
+
+    return {
+        "scanned": scanned,
+        "updated": updated,
+        "removed": len(vanished),
+        "missing_files": missing,
+    }
+
+
+async def reconcile_forever(ipfs_client, interval, workers=HEAD_WORKERS):
+    """Run reconcile() every `interval` seconds until cancelled"""
+    while True:
+        # Sleep first so a scheduled run never competes with cold start
+        await asyncio.sleep(interval)
+        try:
+            async with db_manager.async_session_maker() as session:
+                await reconcile(session, ipfs_client, workers=workers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Reconciliation failed: {e}")
+
+
+async def _main(full, workers):
+    import os
+
+    from dotenv import load_dotenv
+
+    from storage import StorageSettings, storage_from_settings
+
+    load_dotenv()
+    # The same STORAGE_BACKEND and friends the app is configured with
+    storage = storage_from_settings(StorageSettings())
+    await db_manager.connect(os.environ["DATABASE_URL"])
+    try:
+        async with db_manager.async_session_maker() as session:
+            return await reconcile(session, storage, full=full, workers=workers)
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Sync the bucket inventory")
+    parser.add_argument(
+        "--full", action="store_true", help="Re-read every object's CID"
+    )
+    parser.add_argument("--workers", type=int, default=HEAD_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(_main(args.full, args.workers))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,105 @@
+# startup_profile.py - Import and startup timing for cold starts
+"""
+Timing for how long the app takes to become useful after a cold start.
+
+Import this module before anything else in app.py so its clock starts as
+early as possible. Run it directly to get a per-module import breakdown:
+
+    python startup_profile.py [module] [--top N]
+"""
+import time
+
+_started = time.perf_counter()
+
+
+class StartupTimer:
+    """Records named startup phases relative to when this module was imported"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.marks: list[tuple[str, float]] = []
+        self.first_request_at: float | None = None
+
+    def mark(self, name: str) -> None:
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self) -> dict:
+        phases = []
+        previous = 0.0
+        for name, at in self.marks:
+            phases.append(
+                {
+                    "phase": name,
+                    "at_ms": round(at * 1000, 1),
+                    "took_ms": round((at - previous) * 1000, 1),
+                }
+            )
+            previous = at
+
+        return {
+            "phases": phases,
+            "time_to_first_request_ms": (
+                round(self.first_request_at * 1000, 1)
+                if self.first_request_at is not None
+                else None
+            ),
+        }
+
+
+startup_timer = StartupTimer(_started)
+
+
+class FirstRequestTimer:
+    """ASGI middleware that records when the first HTTP request arrives"""
+
+    def __init__(self, app, timer: StartupTimer = startup_timer):
+        self.app = app
+        self.timer = timer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.timer.first_request_at is None:
+            self.timer.first_request_at = time.perf_counter() - self.timer.started
+            self.timer.mark("first request")
+        await self.app(scope, receive, send)
+
+
+def profile_imports(module: str = "app", top: int = 20) -> list[tuple[int, int, str]]:
+    """
+    Import a module in a fresh interpreter with -X importtime
+
+    Returns:
+        list: (cumulative_us, self_us, module) tuples, slowest first
+    """
+    import subprocess
+    import sys
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report slowest imports")
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in profile_imports(args.module, args.top):
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
@@ -66,6 +66,7 @@ class FileUploadHandler {
         this.uploadBtn = document.getElementById('upload-btn');
         this.dropZone = document.getElementById('drop-zone');
         this.fileNameDisplay = document.getElementById('file-name');
+        this.directUploads = this.uploadForm?.dataset.directUploads === 'true';
         
         this.maxFileSize = 100 * 1024 * 1024; // 100MB
     }
@@ -152,20 +153,20 @@ class FileUploadHandler {
             return;
         }
 
-        const formData = new FormData();
-        formData.append('file', file);
-
         this.setUploadingState(true);
 
         try {
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
+            const response = this.directUploads
+                ? await this.uploadDirect(file)
+                : await this.uploadViaServer(file);
 
-            const data = await response.json();
+            let data = await response.json();
 
-            if (response.ok) {
+            if (response.status === 202) {
+                data = await this.waitForJob(data.status_url);
+            }
+
+            if (response.ok && data.status !== 'failed') {
                 this.handleUploadSuccess(data);
             } else {
                 this.handleUploadError(data.message || 'Upload failed');
@@ -179,6 +180,80 @@ class FileUploadHandler {
         }
     }
 
+    async uploadViaServer(file) {
+        const formData = new FormData();
+        formData.append('file', file);
+
+        return fetch('/upload', {
+            method: 'POST',
+            body: formData
+        });
+    }
+
+    async uploadDirect(file) {
+        // Ask the server for a presigned URL, send the bytes straight to
+        // storage, then tell the server to record the upload
+        const presignData = new FormData();
+        presignData.append('filename', file.name);
+        presignData.append('size', file.size);
+
+        const presignResponse = await fetch('/upload/presign', {
+            method: 'POST',
+            body: presignData
+        });
+
+        if (!presignResponse.ok) {
+            return presignResponse;
+        }
+
+        const presign = await presignResponse.json();
+
+        const putResponse = await fetch(presign.upload_url, {
+            method: 'PUT',
+            headers: presign.headers,
+            body: file
+        });
+
+        if (!putResponse.ok) {
+            throw new Error(`Storage upload failed with status ${putResponse.status}`);
+        }
+
+        const completeData = new FormData();
+        completeData.append('key', presign.key);
+
+        return fetch('/upload/complete', {
+            method: 'POST',
+            body: completeData
+        });
+    }
+
+    async waitForJob(statusUrl) {
+        // Background uploads answer 202; poll until the pin succeeds or fails,
+        // giving up after a few minutes in case the queue isn't running
+        const deadline = Date.now() + 5 * 60 * 1000;
+        let delay = 1000;
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+
+            if (!response.ok) {
+                return { status: 'failed', message: job.detail || 'Upload failed' };
+            }
+            if (job.status === 'done') {
+                return job;
+            }
+            if (job.status === 'failed') {
+                return { status: 'failed', message: job.error || 'Upload failed' };
+            }
+            delay = Math.min(delay * 2, 10000);
+        }
+        return {
+            status: 'failed',
+            message: 'Upload is still processing. Refresh the page later to see it.'
+        };
+    }
+
     handleUploadSuccess(data) {
         PopupManager.showUploadSuccess(data);
         this.resetForm();
@@ -272,15 +347,13 @@ class FileViewHandler {
 // COPY HASH HANDLER
 // ============================================
 class CopyHashHandler {
-    constructor() {
-        this.copyButtons = document.querySelectorAll('.copy-btn');
-    }
-
     init() {
-        this.copyButtons.forEach(btn => {
-            btn.addEventListener('click', async (e) => {
-                await this.handleCopy(e.target.closest('.copy-btn'));
-            });
+        // Delegate so rows rendered later (search results) work too
+        document.addEventListener('click', async (e) => {
+            const button = e.target.closest('.copy-btn');
+            if (button) {
+                await this.handleCopy(button);
+            }
         });
     }
 
@@ -323,6 +396,130 @@ class CopyHashHandler {
     }
 }
 
+// ============================================
+// FILE SEARCH HANDLER
+// ============================================
+class FileSearchHandler {
+    constructor() {
+        this.searchInput = document.getElementById('file-search-input');
+        this.tableBody = document.getElementById('files-table-body');
+        this.debounceDelay = 250;
+        this.pageSize = 50;
+        this.timer = null;
+        this.requestSeq = 0;
+    }
+
+    init() {
+        if (!this.searchInput || !this.tableBody) return;
+
+        this.originalRows = this.tableBody.innerHTML;
+
+        this.searchInput.addEventListener('input', () => {
+            clearTimeout(this.timer);
+            this.timer = setTimeout(() => this.search(), this.debounceDelay);
+        });
+    }
+
+    buildQuery(term, cursor) {
+        // ".pdf" filters by extension, "Qm..."/"bafy..." by CID prefix,
+        // anything else matches the filename
+        const params = new URLSearchParams({ limit: this.pageSize });
+        if (/^\.[a-z0-9]+$/i.test(term)) {
+            params.set('ext', term.slice(1));
+        } else if (/^(Qm|baf)[1-9A-Za-z]{2,}$/.test(term)) {
+            params.set('cid_prefix', term);
+        } else {
+            params.set('q', term);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        return params;
+    }
+
+    async search(cursor = null) {
+        const term = this.searchInput.value.trim();
+        const seq = ++this.requestSeq;
+
+        if (!term) {
+            this.tableBody.innerHTML = this.originalRows;
+            return;
+        }
+
+        try {
+            const response = await fetch(`/api/files/search?${this.buildQuery(term, cursor)}`);
+            if (!response.ok) return;
+            const data = await response.json();
+
+            // Ignore answers to queries the user has already typed past
+            if (seq !== this.requestSeq) return;
+
+            if (!cursor) {
+                this.tableBody.innerHTML = '';
+            } else {
+                this.tableBody.querySelector('.load-more-row')?.remove();
+            }
+            this.renderRows(data.results, term, data.next_cursor);
+        } catch (error) {
+            console.error('Search failed:', error);
+        }
+    }
+
+    renderRows(results, term, nextCursor) {
+        const offset = this.tableBody.querySelectorAll('.file-row').length;
+
+        results.forEach((file, i) => {
+            const row = document.createElement('tr');
+            row.className = 'file-row';
+            row.innerHTML = `
+                <td class="col-index"><span class="index-badge"></span></td>
+                <td class="col-filename">
+                    <div class="filename-cell">
+                        <svg class="file-icon" viewBox="0 0 24 24" fill="none">
+                            <path d="M13 2H6a2 2 0 0 0-2 2v16a2 2 0 0 0 2 2h12a2 2 0 0 0 2-2V9z" stroke="currentColor" stroke-width="2"/>
+                            <polyline points="13 2 13 9 20 9" stroke="currentColor" stroke-width="2"/>
+                        </svg>
+                        <span class="filename-text"></span>
+                    </div>
+                </td>
+                <td class="col-hash"><div class="hash-cell"><code class="hash-code"></code></div></td>
+                <td class="col-time"><span class="time-text"></span></td>
+                <td class="col-actions">
+                    <button class="btn-icon copy-btn" title="Copy Hash">
+                        <svg width="16" height="16" viewBox="0 0 24 24" fill="none">
+                            <rect x="9" y="9" width="13" height="13" rx="2" ry="2" stroke="currentColor" stroke-width="2"/>
+                            <path d="M5 15H4a2 2 0 0 1-2-2V4a2 2 0 0 1 2-2h9a2 2 0 0 1 2 2v1" stroke="currentColor" stroke-width="2"/>
+                        </svg>
+                        <span class="btn-text">Copy</span>
+                    </button>
+                </td>
+            `;
+            // Filenames are user input: set them as text, never as HTML
+            row.querySelector('.index-badge').textContent = offset + i + 1;
+            row.querySelector('.filename-text').textContent = file.filename;
+            row.querySelector('.hash-code').textContent = file.ipfs_hash;
+            row.querySelector('.time-text').textContent = file.uploaded_at;
+            row.querySelector('.copy-btn').dataset.hash = file.ipfs_hash;
+            this.tableBody.appendChild(row);
+        });
+
+        if (nextCursor) {
+            const row = document.createElement('tr');
+            row.className = 'load-more-row';
+            row.innerHTML = '<td colspan="5"><button type="button" class="btn btn-secondary">Load more</button></td>';
+            row.querySelector('button').addEventListener('click', () => this.search(nextCursor));
+            this.tableBody.appendChild(row);
+        }
+
+        if (!this.tableBody.children.length) {
+            const row = document.createElement('tr');
+            row.innerHTML = '<td colspan="5" class="hint-text"></td>';
+            row.firstElementChild.textContent = `No files match "${term}"`;
+            this.tableBody.appendChild(row);
+        }
+    }
+}
+
 // ============================================
 // POPUP MANAGER
 // ============================================
@@ -453,11 +650,13 @@ document.addEventListener('DOMContentLoaded', () => {
     const fileUploadHandler = new FileUploadHandler();
     const fileViewHandler = new FileViewHandler();
     const copyHashHandler = new CopyHashHandler();
+    const fileSearchHandler = new FileSearchHandler();
 
     sessionManager.init();
     fileUploadHandler.init();
     fileViewHandler.init();
     copyHashHandler.init();
+    fileSearchHandler.init();
     UIManager.setupModalHandlers();
 
     // Add loading animation to login container
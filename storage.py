@@ -0,0 +1,803 @@
+# storage.py - Interchangeable storage backends and hot/cold tiering
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+
+from pydantic_settings import BaseSettings
+
+from ipfs_cid import (
+    IDENTITY,
+    RAW,
+    InvalidBlock,
+    file_block_contents,
+    parse_cid,
+    raw_cid,
+    verify_block,
+)
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK = 1024 * 1024
+PAGE_SIZE = 1000
+
+# Concurrent head_object calls when scanning the bucket
+HEAD_WORKERS = 16
+
+DEFAULT_GATEWAYS = (
+    "https://ipfs.filebase.io/ipfs/",
+    "https://ipfs.io/ipfs/",
+    "https://gateway.pinata.cloud/ipfs/",
+    "https://cloudflare-ipfs.com/ipfs/",
+)
+
+
+# Largest block a gateway may send; IPFS blocks are at most 2 MiB
+MAX_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class ContentReader(ABC):
+    """
+    Read-only source of files by CID.
+
+    The narrow interface behind read fallbacks: whatever can fetch a CID,
+    whether or not it can also store objects.
+    """
+
+    @abstractmethod
+    def download_file(self, ipfs_hash):
+        """Read an object by CID"""
+
+    def iter_download(self, ipfs_hash):
+        """Read an object by CID as an iterator of byte chunks"""
+        yield self.download_file(ipfs_hash)
+
+
+class StorageBackend(ContentReader):
+    """
+    Interface shared by the storage backends.
+
+    Objects are stored under S3-style keys and identified by their IPFS CID.
+    Presigned URLs are optional; only backends that set
+    supports_presigned_urls have to provide them.
+    """
+
+    # Whether the browser can be handed presigned URLs (DIRECT_TRANSFERS)
+    supports_presigned_urls = False
+
+    def warm_up(self):
+        """Prepare connections ahead of the first request that needs them"""
+        return None
+
+    @abstractmethod
+    def upload_file(self, file_path, content_encoding=None):
+        """Store a file under its basename and return its CID"""
+
+    @abstractmethod
+    def put_object(self, key, data):
+        """Store bytes under a key and return their CID"""
+
+    @abstractmethod
+    def get_object(self, key):
+        """Read an object by key"""
+
+    @abstractmethod
+    def get_cid(self, key):
+        """Look up the CID of the object stored under a key"""
+
+    @abstractmethod
+    def stat_object(self, key):
+        """Look up the (CID, size) of the object stored under a key"""
+
+    @abstractmethod
+    def get_cids(self, keys, workers=None):
+        """Look up CIDs for many keys, with None for keys that can't be read"""
+
+    @abstractmethod
+    def iter_object_pages(self, prefix=None):
+        """Yield every stored object, a page at a time, as listing entries"""
+
+    @abstractmethod
+    def get_file_info(self, ipfs_hash):
+        """Describe the object with a CID, or None if it isn't stored here"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove the object stored under a key"""
+
+    def generate_upload_url(
+        self, key, content_type=None, content_length=None, expires_in=3600
+    ):
+        raise NotImplementedError(f"{type(self).__name__} can't presign URLs")
+
+    def generate_download_url(
+        self, key, content_type=None, content_disposition=None, expires_in=3600
+    ):
+        raise NotImplementedError(f"{type(self).__name__} can't presign URLs")
+
+
+class GatewayReader(ContentReader):
+    """
+    Read-only source that fetches CIDs from public IPFS HTTP gateways.
+
+    Gateways aren't trusted. Files are fetched block by block in the
+    trustless raw-block format, and each block is checked against the CID
+    that names it before any of its bytes are released. A gateway that
+    fails or returns a bad block is skipped for that block and the next one
+    is tried.
+    """
+
+    def __init__(self, gateways=DEFAULT_GATEWAYS, timeout=30, prefetch=4):
+        self.gateways = [g.rstrip("/") for g in gateways]
+        self.timeout = timeout
+        self.prefetch = prefetch
+        self._preferred = 0  # Index of the gateway that last served a block
+        self._local = threading.local()
+
+    def _session(self):
+        import requests
+
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _read_block(self, url):
+        """GET a raw block, refusing anything larger than a block can be"""
+        with self._session().get(
+            url,
+            params={"format": "raw"},
+            headers={"Accept": "application/vnd.ipld.raw"},
+            timeout=self.timeout,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_BLOCK_SIZE:
+                    raise InvalidBlock(f"Block larger than {MAX_BLOCK_SIZE} bytes")
+            return bytes(data)
+
+    def fetch_block(self, cid):
+        """
+        Fetch one block and verify it, failing over between gateways
+
+        Raises:
+            Exception: If no gateway returned a block matching the CID
+        """
+        import requests
+
+        if cid.hash_code == IDENTITY:
+            return cid.digest  # The data is inlined in the CID
+
+        count = len(self.gateways)
+        first = self._preferred
+        for attempt in range(count):
+            index = (first + attempt) % count
+            gateway_url = f"{self.gateways[index]}/{cid}"
+            try:
+                block = self._read_block(gateway_url)
+                verify_block(cid, block)
+            except InvalidBlock as e:
+                logger.warning(f"🚫 Gateway {gateway_url} returned a bad block: {e}")
+                continue
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Gateway {gateway_url} failed: {e}")
+                continue
+            self._preferred = index
+            return block
+
+        raise Exception(f"No gateway returned a valid block for {cid}")
+
+    def iter_download(self, ipfs_hash):
+        """
+        Stream a file's verified bytes, prefetching up to `prefetch` blocks ahead
+
+        Raises:
+            Exception: If a block can't be fetched intact from any gateway,
+            which aborts the stream part way through
+        """
+        logger.info(f"Attempting to download {ipfs_hash} from public IPFS gateways")
+        root = parse_cid(ipfs_hash)
+
+        with ThreadPoolExecutor(max_workers=self.prefetch) as pool:
+            # Blocks still to emit, in file order, with their fetch if started
+            pending = deque([[root, None]])
+            while pending:
+                for entry in islice(pending, self.prefetch):
+                    if entry[1] is None:
+                        entry[1] = pool.submit(self.fetch_block, entry[0])
+
+                cid, future = pending.popleft()
+                data, links = file_block_contents(cid, future.result())
+                pending.extendleft([[link, None] for link in reversed(links)])
+                if data:
+                    yield data
+
+    def download_file(self, ipfs_hash):
+        """
+        Download and verify a whole file from the gateways
+
+        Raises:
+            Exception: If no gateway could serve the CID intact
+        """
+        try:
+            content = b"".join(self.iter_download(ipfs_hash))
+        except Exception as e:
+            raise Exception(
+                f"Failed to download file with CID {ipfs_hash} from any source: {e}"
+            )
+        logger.info(f"Downloaded and verified {ipfs_hash} from gateways")
+        return content
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores objects as plain files under a root folder.
+
+    Bytes are content addressed: blobs/<cid> holds an object's bytes,
+    meta/<key>.json maps a key to its CID, size and encoding, and cids/<cid>
+    names the key that last stored a CID. Overwriting a key only moves its
+    pointer, so every CID handed out stays readable. CIDs are computed
+    locally as raw CIDv1 over the whole object unless the caller supplies one.
+    """
+
+    def __init__(self, root, fallback=None):
+        self.root = root
+        self.fallback = fallback
+        for folder in ("blobs", "meta", "cids", "tmp"):
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    def _path(self, folder, name):
+        base = os.path.join(self.root, folder)
+        path = os.path.normpath(os.path.join(base, name))
+        if not path.startswith(base + os.sep):
+            raise ValueError(f"Invalid storage key: {name}")
+        return path
+
+    def _read_meta(self, key):
+        with open(self._path("meta", f"{key}.json")) as f:
+            return json.load(f)
+
+    def _iter_meta_keys(self):
+        """Yield (key, metadata path) for every stored key, in key order"""
+        base = os.path.join(self.root, "meta")
+        for folder, _, names in sorted(os.walk(base)):
+            for name in sorted(names):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(folder, name)
+                key = os.path.relpath(path, base)[: -len(".json")]
+                yield key.replace(os.sep, "/"), path
+
+    def _spool(self, source):
+        """Copy a file object to a temp file, returning (path, sha256, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while chunk := source.read(COPY_CHUNK):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.digest(), size
+
+    def _place(self, tmp_path, path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _write_atomic(self, path, data):
+        tmp_path, _, _ = self._spool(io.BytesIO(data))
+        self._place(tmp_path, path)
+
+    def _store(self, key, source, cid=None, content_encoding=None):
+        try:
+            previous = self.get_cid(key)
+        except (OSError, ValueError):
+            previous = None
+
+        tmp_path, digest, size = self._spool(source)
+        cid = cid or raw_cid(digest)
+        self._place(tmp_path, self._path("blobs", cid))
+
+        meta = {"cid": cid, "size": size, "content_encoding": content_encoding}
+        self._write_atomic(
+            self._path("meta", f"{key}.json"), json.dumps(meta).encode()
+        )
+        self._write_atomic(self._path("cids", cid), key.encode())
+        # The old CID's bytes stay readable, but no longer under this key
+        if previous and previous != cid and self.key_for(previous) == key:
+            os.remove(self._path("cids", previous))
+        return cid
+
+    def upload_file(self, file_path, content_encoding=None, cid=None):
+        """
+        Copy a file into the store under its basename
+
+        Args:
+            file_path: Path to the file to store
+            content_encoding: Codec the file is compressed with, if any
+            cid: CID to record instead of computing one (used by the hot tier)
+
+        Returns:
+            str: CID of the stored object
+        """
+        try:
+            with open(file_path, "rb") as f:
+                return self._store(os.path.basename(file_path), f, cid, content_encoding)
+        except FileNotFoundError:
+            raise Exception(f"File not found: {file_path}")
+
+    def put_object(self, key, data, cid=None):
+        return self._store(key, io.BytesIO(data), cid)
+
+    def read_cid(self, ipfs_hash):
+        """
+        Read the bytes stored for a CID, checking raw CIDs against their hash
+
+        Raises:
+            OSError: If no bytes are stored for the CID
+            InvalidBlock: If the stored bytes don't match the CID
+        """
+        with open(self._path("blobs", ipfs_hash), "rb") as f:
+            data = f.read()
+        try:
+            cid = parse_cid(ipfs_hash)
+        except ValueError:
+            cid = None
+        # A raw CID hashes the whole object; others name a DAG we don't keep
+        if cid is not None and cid.codec == RAW:
+            verify_block(cid, data)
+        return data
+
+    def get_object(self, key):
+        return self.read_cid(self.get_cid(key))
+
+    def get_cid(self, key):
+        return self._read_meta(key)["cid"]
+
+    def stat_object(self, key):
+        meta = self._read_meta(key)
+        return meta["cid"], meta["size"]
+
+    def get_cids(self, keys, workers=None):
+        cids = {}
+        for key in keys:
+            try:
+                cids[key] = self.get_cid(key)
+            except (OSError, ValueError) as e:
+                logger.warning(f"No metadata for {key}: {e}")
+                cids[key] = None
+        return cids
+
+    def key_for(self, ipfs_hash):
+        """Key currently storing a CID, or None"""
+        try:
+            with open(self._path("cids", ipfs_hash)) as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def iter_object_pages(self, prefix=None):
+        page = []
+        for key, path in self._iter_meta_keys():
+            if prefix and not key.startswith(prefix):
+                continue
+            try:
+                with open(path) as f:
+                    size = json.load(f)["size"]
+                modified = os.stat(path).st_mtime
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable metadata for {key}: {e}")
+                continue
+            page.append(
+                {
+                    "Key": key,
+                    "Size": size,
+                    "LastModified": datetime.fromtimestamp(modified, tz=timezone.utc),
+                }
+            )
+            if len(page) == PAGE_SIZE:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def _read_local(self, ipfs_hash):
+        """Read a CID's local bytes, or None if they're missing or don't match"""
+        try:
+            return self.read_cid(ipfs_hash)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, InvalidBlock) as e:
+            logger.warning(f"🚫 Local copy of {ipfs_hash} unusable: {e}")
+            return None
+
+    def download_file(self, ipfs_hash):
+        data = self._read_local(ipfs_hash)
+        if data is not None:
+            return data
+
+        if self.fallback is None:
+            raise Exception(f"Download failed: {ipfs_hash} is not in local storage")
+        return self.fallback.download_file(ipfs_hash)
+
+    def iter_download(self, ipfs_hash):
+        data = self._read_local(ipfs_hash)
+        if data is not None:
+            yield data
+        elif self.fallback is not None:
+            yield from self.fallback.iter_download(ipfs_hash)
+        else:
+            raise Exception(f"Download failed: {ipfs_hash} is not in local storage")
+
+    def get_file_info(self, ipfs_hash):
+        try:
+            stat = os.stat(self._path("blobs", ipfs_hash))
+        except (OSError, ValueError):
+            return None
+        return {
+            "key": self.key_for(ipfs_hash),
+            "size": stat.st_size,
+            "last_modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            "cid": ipfs_hash,
+        }
+
+    def delete(self, key):
+        """Remove a key, and its bytes unless another key now stores them"""
+        try:
+            cid = self.get_cid(key)
+        except (OSError, ValueError):
+            cid = None
+        paths = [self._path("meta", f"{key}.json")]
+        if cid and self.key_for(cid) in (key, None):
+            paths += [self._path("cids", cid), self._path("blobs", cid)]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class TieringPolicy:
+    """
+    Decides which objects live on the hot tier.
+
+    A cold object is promoted once it has been read promote_hits times. Hot
+    objects unread for idle_seconds are demoted, and when the tier is over
+    max_bytes the least frequently read objects go first, oldest read
+    breaking ties.
+    """
+
+    # Read counts are kept for at most this many cold keys
+    MAX_TRACKED = 10000
+
+    def __init__(self, max_bytes, idle_seconds, promote_hits=1):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.promote_hits = promote_hits
+        self.hot_bytes = 0
+        self._hot: dict[str, list] = {}  # key -> [size, hits, last_read]
+        self._cold_hits: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, key, size, last_read):
+        """Register an object already on the hot tier at startup"""
+        with self._lock:
+            self._hot[key] = [size, 0, last_read]
+            self.hot_bytes += size
+
+    def touch(self, key):
+        """Record a read, returning whether the key is on the hot tier"""
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is None:
+                return False
+            entry[1] += 1
+            entry[2] = time.time()
+            return True
+
+    def record_cold_read(self, key):
+        """Record a read served by the cold tier, returning whether to promote"""
+        with self._lock:
+            hits = self._cold_hits.pop(key, 0) + 1
+            if hits >= self.promote_hits:
+                return True
+            self._cold_hits[key] = hits
+            while len(self._cold_hits) > self.MAX_TRACKED:
+                self._cold_hits.popitem(last=False)
+            return False
+
+    def admissible(self, size):
+        return size <= self.max_bytes
+
+    def admit(self, key, size):
+        with self._lock:
+            previous = self._hot.pop(key, None)
+            if previous:
+                self.hot_bytes -= previous[0]
+            self._hot[key] = [size, 1, time.time()]
+            self.hot_bytes += size
+
+    def forget(self, key):
+        with self._lock:
+            entry = self._hot.pop(key, None)
+            if entry:
+                self.hot_bytes -= entry[0]
+
+    def victims(self, keep=None):
+        """
+        Remove and return the keys that should leave the hot tier
+
+        Args:
+            keep: Key just admitted, which isn't evicted to make room for itself
+        """
+        now = time.time()
+        with self._lock:
+            demoted = [
+                key
+                for key, (_, _, last_read) in self._hot.items()
+                if now - last_read > self.idle_seconds
+            ]
+            if self.hot_bytes > self.max_bytes:
+                coldest = sorted(
+                    (
+                        item
+                        for item in self._hot.items()
+                        if item[0] not in demoted and item[0] != keep
+                    ),
+                    key=lambda item: (item[1][1], item[1][2]),
+                )
+                excess = self.hot_bytes - sum(self._hot[k][0] for k in demoted)
+                for key, (size, _, _) in coldest:
+                    if excess <= self.max_bytes:
+                        break
+                    demoted.append(key)
+                    excess -= size
+
+            for key in demoted:
+                self.hot_bytes -= self._hot.pop(key)[0]
+            return demoted
+
+
+class TieredStorage(StorageBackend):
+    """
+    A local hot tier in front of a durable cold tier (Filebase).
+
+    Writes go to the cold tier first, which assigns the CID, and are then
+    copied to the hot tier under the same CID. Reads are served locally when
+    possible, and the policy decides what gets promoted and demoted. The
+    cold tier always holds everything, so demoting just drops the local copy.
+    """
+
+    def __init__(self, hot, cold, policy):
+        self.hot = hot
+        self.cold = cold
+        self.policy = policy
+
+        for page in hot.iter_object_pages():
+            for obj in page:
+                policy.load(obj["Key"], obj["Size"], obj["LastModified"].timestamp())
+        self._demote()
+        logger.info(
+            f"🗄️ Hot tier holds {policy.hot_bytes} of {policy.max_bytes} bytes"
+        )
+
+    @property
+    def supports_presigned_urls(self):
+        return self.cold.supports_presigned_urls
+
+    def _admit(self, key, size, store):
+        """Copy an object to the hot tier; failures only cost the cache entry"""
+        # Whatever the key held before is stale now, admitted or not
+        self.policy.forget(key)
+        try:
+            self.hot.delete(key)
+        except OSError as e:
+            logger.warning(f"Could not drop the old hot copy of {key}: {e}")
+        if not self.policy.admissible(size):
+            return
+        try:
+            store()
+        except Exception as e:
+            logger.warning(f"Could not copy {key} to the hot tier: {e}")
+            return
+        self.policy.admit(key, size)
+        self._demote(keep=key)
+
+    def _demote(self, keep=None):
+        for key in self.policy.victims(keep):
+            try:
+                self.hot.delete(key)
+                logger.info(f"🧊 Demoted {key} from the hot tier")
+            except OSError as e:
+                logger.warning(f"Could not demote {key}: {e}")
+
+    def warm_up(self):
+        return self.cold.warm_up()
+
+    def upload_file(self, file_path, content_encoding=None):
+        cid = self.cold.upload_file(file_path, content_encoding)
+        self._admit(
+            os.path.basename(file_path),
+            os.path.getsize(file_path),
+            lambda: self.hot.upload_file(file_path, content_encoding, cid=cid),
+        )
+        return cid
+
+    def put_object(self, key, data):
+        cid = self.cold.put_object(key, data)
+        self._admit(key, len(data), lambda: self.hot.put_object(key, data, cid=cid))
+        return cid
+
+    def _read_hot(self, key, ipfs_hash=None):
+        """Read a hot copy, by CID when one is asked for so only it can match"""
+        if not self.policy.touch(key):
+            return None
+        try:
+            return self.hot.read_cid(ipfs_hash or self.hot.get_cid(key))
+        except (OSError, ValueError, InvalidBlock) as e:
+            logger.warning(f"Hot copy of {key} unreadable: {e}")
+            self.policy.forget(key)
+            return None
+
+    def get_object(self, key):
+        data = self._read_hot(key)
+        if data is not None:
+            return data
+
+        data = self.cold.get_object(key)
+        if self.policy.record_cold_read(key):
+            self._admit(
+                key,
+                len(data),
+                lambda: self.hot.put_object(key, data, cid=self.cold.get_cid(key)),
+            )
+        return data
+
+    def download_file(self, ipfs_hash):
+        key = self.hot.key_for(ipfs_hash)
+        if key is not None:
+            data = self._read_hot(key, ipfs_hash)
+            if data is not None:
+                return data
+
+        data = self.cold.download_file(ipfs_hash)
+        # Objects fetched by CID alone are cached under a key of their own
+        key = key or f"ipfs/{ipfs_hash}"
+        if self.policy.record_cold_read(key):
+            self._admit(
+                key, len(data), lambda: self.hot.put_object(key, data, cid=ipfs_hash)
+            )
+        return data
+
+    def get_cid(self, key):
+        return self.cold.get_cid(key)
+
+    def stat_object(self, key):
+        return self.cold.stat_object(key)
+
+    def get_cids(self, keys, workers=None):
+        if workers is None:
+            return self.cold.get_cids(keys)
+        return self.cold.get_cids(keys, workers)
+
+    def iter_object_pages(self, prefix=None):
+        return self.cold.iter_object_pages(prefix)
+
+    def get_file_info(self, ipfs_hash):
+        return self.cold.get_file_info(ipfs_hash)
+
+    def delete(self, key):
+        self.cold.delete(key)
+        self.policy.forget(key)
+        self.hot.delete(key)
+
+    def generate_upload_url(
+        self, key, content_type=None, content_length=None, expires_in=3600
+    ):
+        return self.cold.generate_upload_url(
+            key, content_type, content_length, expires_in
+        )
+
+    def generate_download_url(
+        self, key, content_type=None, content_disposition=None, expires_in=3600
+    ):
+        return self.cold.generate_download_url(
+            key, content_type, content_disposition, expires_in
+        )
+
+
+class StorageSettings(BaseSettings):
+    """
+    Settings that pick and configure the storage backend.
+
+    The app's Settings extend these, so tools that only need storage (like
+    reconcile.py) build the same backend from the same environment.
+    """
+
+    UPLOAD_FOLDER: str = "uploads"
+    STORAGE_BACKEND: str = "filebase"  # "filebase", "local" or "tiered"
+    LOCAL_STORAGE_PATH: str = ""  # Local store / hot tier, defaults to UPLOAD_FOLDER/store
+    HOT_TIER_MAX_BYTES: int = 1024 * 1024 * 1024
+    HOT_TIER_IDLE_SECONDS: int = 7 * 24 * 3600  # Demote hot objects unread this long
+    HOT_TIER_PROMOTE_HITS: int = 2  # Cold reads before an object is promoted
+    IPFS_GATEWAYS: str = ""  # Comma-separated gateway base URLs, empty = defaults
+
+    class Config:
+        env_file = ".env"
+        case_sensitive = True
+        extra = "ignore"
+        env_file_encoding = "utf-8"
+
+
+def storage_from_settings(settings):
+    """Build the storage backend StorageSettings (or a subclass) describe"""
+    return create_storage(
+        settings.STORAGE_BACKEND,
+        root=settings.LOCAL_STORAGE_PATH
+        or os.path.join(settings.UPLOAD_FOLDER, "store"),
+        gateways=[g.strip() for g in settings.IPFS_GATEWAYS.split(",") if g.strip()]
+        or DEFAULT_GATEWAYS,
+        hot_max_bytes=settings.HOT_TIER_MAX_BYTES,
+        hot_idle_seconds=settings.HOT_TIER_IDLE_SECONDS,
+        promote_hits=settings.HOT_TIER_PROMOTE_HITS,
+    )
+
+
+def create_storage(
+    backend,
+    root,
+    gateways=DEFAULT_GATEWAYS,
+    hot_max_bytes=1024**3,
+    hot_idle_seconds=7 * 24 * 3600,
+    promote_hits=1,
+):
+    """
+    Build the configured storage backend
+
+    Args:
+        backend: "filebase", "local" or "tiered"
+        root: Folder for local storage or the hot tier
+        gateways: Public gateway base URLs to fall back to for reads
+
+    Returns:
+        StorageBackend: The backend the app reads and writes through
+    """
+    reader = GatewayReader(gateways)
+    if backend == "local":
+        logger.info(f"🗄️ Using local storage at {root}")
+        return LocalStorage(root, fallback=reader)
+
+    # Filebase credentials are only required when Filebase is in use
+    from ipfs_client import IPFSClient
+
+    filebase = IPFSClient(gateway_reader=reader)
+    if backend == "filebase":
+        return filebase
+    if backend == "tiered":
+        logger.info(f"🗄️ Using tiered storage, hot tier at {root}")
+        return TieredStorage(
+            LocalStorage(root),
+            filebase,
+            TieringPolicy(hot_max_bytes, hot_idle_seconds, promote_hits),
+        )
+
+    raise ValueError(
+        f"Unknown storage backend {backend!r}, expected 'filebase', 'local' or 'tiered'"
+    )
@@ -0,0 +1,43 @@
+# conftest.py - run the app against local storage and a scratch SQLite file
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import loadgen  # noqa: E402
+
+WORKDIR = tempfile.mkdtemp(prefix="ipfs-app-tests-")
+# Must happen before app is imported, since its settings are read at import
+loadgen.prepare_environment(WORKDIR, "local", None)
+
+_users = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def app():
+    return loadgen.load_app()
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def login(client):
+    """Log a fresh user in through the faked OAuth callback"""
+
+    def login(http=client):
+        number = next(_users)
+        response = http.get(f"/auth?user={number}", follow_redirects=False)
+        assert response.status_code == 302
+        return f"loadgen{number}@example.com"
+
+    return login
@@ -0,0 +1,70 @@
+import pytest
+
+from storage import LocalStorage
+
+
+class PresigningStorage(LocalStorage):
+    """Local storage that hands out fake presigned URLs and remembers them"""
+
+    supports_presigned_urls = True
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.signed = {}
+
+    def generate_upload_url(
+        self, key, content_type=None, content_length=None, expires_in=3600
+    ):
+        self.signed[key] = content_length
+        return f"https://bucket.example/{key}"
+
+
+@pytest.fixture
+def direct(app, tmp_path, monkeypatch):
+    import app as app_module
+
+    storage = PresigningStorage(str(tmp_path / "bucket"))
+    monkeypatch.setattr(app_module, "ipfs_client", storage)
+    monkeypatch.setattr(app_module.settings, "DIRECT_TRANSFERS", True)
+    return storage
+
+
+def presign(client, filename, size):
+    response = client.post("/upload/presign", data={"filename": filename, "size": size})
+    assert response.status_code == 200, response.text
+    return response.json()["key"]
+
+
+def test_each_direct_upload_gets_its_own_key(client, login, direct):
+    login()
+    first = presign(client, "report.pdf", 10)
+    login()
+    second = presign(client, "report.pdf", 10)
+
+    assert first != second
+    assert first.endswith("/report.pdf") and second.endswith("/report.pdf")
+    assert direct.signed == {first: 10, second: 10}
+
+
+def test_oversized_direct_upload_is_deleted(client, login, direct, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.settings, "MAX_CONTENT_LENGTH", 100)
+    login()
+    key = presign(client, "big.zip", 10)
+    direct.put_object(key, b"x" * 101)  # The browser ignoring the claimed size
+
+    response = client.post("/upload/complete", data={"key": key})
+    assert response.status_code == 413
+    assert list(direct.iter_object_pages()) == []
+
+
+def test_direct_upload_is_recorded_under_its_filename(client, login, direct):
+    login()
+    key = presign(client, "notes.txt", 5)
+    direct.put_object(key, b"notes")
+
+    response = client.post("/upload/complete", data={"key": key})
+    assert response.status_code == 200, response.text
+    results = client.get("/api/files/search", params={"q": "notes"}).json()["results"]
+    assert [row["filename"] for row in results] == ["notes.txt"]
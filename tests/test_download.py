@@ -0,0 +1,30 @@
+import asyncio
+
+from sqlalchemy import select
+
+
+def inventory(key):
+    from database import StoredObject, db_manager
+
+    async def read():
+        async with db_manager.async_session_maker() as session:
+            result = await session.execute(
+                select(StoredObject.ipfs_hash).where(StoredObject.key == key)
+            )
+            return result.scalar_one()
+
+    return asyncio.run(read())
+
+
+def test_overwritten_inventory_key_is_not_served(client, login):
+    import app as app_module
+
+    login()
+    upload = client.post("/upload", files={"file": ("shared.txt", b"original")}).json()
+    # The key changes hands without the inventory row being updated
+    replaced = app_module.ipfs_client.put_object("shared.txt", b"someone else's")
+
+    response = client.get("/download", params={"ipfs_hash": upload["ipfs_hash"]})
+    assert response.status_code == 200
+    assert response.content == b"original"
+    assert inventory("shared.txt") == replaced
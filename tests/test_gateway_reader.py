@@ -0,0 +1,127 @@
+import pytest
+import requests
+
+from ipfs_cid import CID, IDENTITY, RAW
+from storage import MAX_BLOCK_SIZE, GatewayReader
+from test_ipfs_cid import MULTI_BLOCK_FILE, build_dag, read_upload
+
+
+class FakeResponse:
+    def __init__(self, url, body):
+        self.url = url
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.body is None:
+            raise requests.exceptions.HTTPError(f"404 for {self.url}")
+
+    def iter_content(self, chunk_size):
+        for offset in range(0, len(self.body), chunk_size):
+            self.sent = offset + chunk_size
+            yield self.body[offset : offset + chunk_size]
+
+
+class FakeSession:
+    """Serves blocks per gateway, letting a test swap in what each one returns"""
+
+    def __init__(self, gateways):
+        self.gateways = gateways
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append(url)
+        gateway, cid = url.rsplit("/", 1)
+        self.last_response = FakeResponse(url, self.gateways[gateway](cid))
+        return self.last_response
+
+
+def reader_for(gateways, **kwargs):
+    reader = GatewayReader(list(gateways), **kwargs)
+    session = FakeSession(gateways)
+    reader._session = lambda: session
+    return reader, session
+
+
+@pytest.fixture(scope="module")
+def dag():
+    data = read_upload(MULTI_BLOCK_FILE)
+    _, blocks = build_dag(data)
+    return data, blocks
+
+
+def test_download_verifies_every_block(dag):
+    data, blocks = dag
+    reader, session = reader_for({"https://good/ipfs": blocks.get})
+
+    assert reader.download_file(MULTI_BLOCK_FILE) == data
+    assert len(session.requests) == len(blocks)
+
+
+def test_bad_block_fails_over_to_the_next_gateway(dag):
+    data, blocks = dag
+    tampered = next(cid for cid in blocks if cid != MULTI_BLOCK_FILE)
+
+    def evil(cid):
+        block = blocks.get(cid)
+        return b"X" + block[1:] if cid == tampered else block
+
+    reader, session = reader_for(
+        {"https://evil/ipfs": evil, "https://good/ipfs": blocks.get}, prefetch=1
+    )
+
+    assert reader.download_file(MULTI_BLOCK_FILE) == data
+    assert f"https://good/ipfs/{tampered}" in session.requests
+
+
+def test_missing_block_fails_over_to_the_next_gateway(dag):
+    data, blocks = dag
+    reader, _ = reader_for(
+        {"https://empty/ipfs": lambda cid: None, "https://good/ipfs": blocks.get}
+    )
+
+    assert reader.download_file(MULTI_BLOCK_FILE) == data
+
+
+def test_stream_stops_at_a_block_no_gateway_serves_intact(dag):
+    data, blocks = dag
+    last = list(blocks)[-2]  # Final leaf; blocks ends with the root
+
+    def evil(cid):
+        block = blocks.get(cid)
+        return b"X" + block[1:] if cid == last else block
+
+    reader, _ = reader_for({"https://evil/ipfs": evil}, prefetch=1)
+    received = b""
+    with pytest.raises(Exception, match="No gateway returned a valid block"):
+        for chunk in reader.iter_download(MULTI_BLOCK_FILE):
+            received += chunk
+
+    # Everything released before the bad block was verified file content
+    assert received and data.startswith(received)
+    assert len(received) < len(data)
+
+
+def test_oversized_block_is_refused():
+    oversized = b"x" * (4 * MAX_BLOCK_SIZE)
+    cid = "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"
+    reader, session = reader_for({"https://huge/ipfs": lambda _: oversized})
+
+    with pytest.raises(Exception, match="Failed to download"):
+        reader.download_file(cid)
+    assert session.requests == [f"https://huge/ipfs/{cid}"]
+    # Reading stopped at the limit rather than buffering the whole body
+    assert session.last_response.sent < 2 * MAX_BLOCK_SIZE
+
+
+def test_identity_cid_needs_no_gateway():
+    reader, session = reader_for({"https://unused/ipfs": lambda cid: None})
+    cid = CID(1, RAW, IDENTITY, b"inline!")
+
+    assert reader.download_file(str(cid)) == b"inline!"
+    assert session.requests == []
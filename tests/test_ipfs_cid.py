@@ -0,0 +1,129 @@
+import hashlib
+import os
+
+import pytest
+
+from ipfs_cid import (
+    CID,
+    DAG_PB,
+    RAW,
+    SHA2_256,
+    InvalidBlock,
+    _b58encode,
+    _varint,
+    file_block_contents,
+    parse_cid,
+    raw_cid,
+    verify_block,
+)
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
+SINGLE_BLOCK_FILES = (
+    "QmRJeo7maarVVuigeMNzscdqxe8CbWNhtQmXKE91C3ZLLz",
+    "QmeXf17pcLf6MZmcg1GWFdZLxqrJqjHRpnfmAPmE4RsaXT",
+)
+MULTI_BLOCK_FILE = "QmckEm1Z6MRrp53iTfV1Co8pVzkwbC1qTi7sshW8zZHd3z"
+# Default kubo chunker size
+CHUNK_SIZE = 256 * 1024
+
+
+def field(number, value):
+    if isinstance(value, int):
+        return _varint(number << 3) + _varint(value)
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def file_leaf(chunk):
+    """dag-pb block kubo builds for one chunk of a CIDv0 file"""
+    return field(1, field(1, 2) + field(2, chunk) + field(3, len(chunk)))
+
+
+def file_root(blocks, chunk_sizes):
+    """dag-pb block linking leaves, in kubo's encoding (Links before Data)"""
+    links = b"".join(
+        field(
+            2,
+            field(1, CID(0, DAG_PB, SHA2_256, sha256(block)).multihash())
+            + field(2, b"")
+            + field(3, len(block)),
+        )
+        for block in blocks
+    )
+    sizes = b"".join(field(4, size) for size in chunk_sizes)
+    return links + field(1, field(1, 2) + field(3, sum(chunk_sizes)) + sizes)
+
+
+def sha256(data):
+    return hashlib.sha256(data).digest()
+
+
+def read_upload(name):
+    with open(os.path.join(UPLOADS, name), "rb") as f:
+        return f.read()
+
+
+def build_dag(data):
+    """Return (root CID, {CID string: block}) for a file, laid out as kubo does"""
+    chunks = [data[i : i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+    leaves = [file_leaf(chunk) for chunk in chunks]
+    blocks = {str(CID(0, DAG_PB, SHA2_256, sha256(leaf))): leaf for leaf in leaves}
+    root = file_root(leaves, [len(chunk) for chunk in chunks])
+    root_cid = CID(0, DAG_PB, SHA2_256, sha256(root))
+    blocks[str(root_cid)] = root
+    return root_cid, blocks
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o",
+        "bafkreibuy6j4tpvuiqgpyo5n22lxmbyscux4xyejawtkee33hck725yz34",
+        "bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi",
+    ],
+)
+def test_cid_round_trip(text):
+    assert str(parse_cid(text)) == text
+
+
+def test_cid_encodings_agree():
+    cid = parse_cid("bafkreibuy6j4tpvuiqgpyo5n22lxmbyscux4xyejawtkee33hck725yz34")
+    binary = _varint(1) + _varint(cid.codec) + cid.multihash()
+
+    assert cid.codec == RAW
+    assert parse_cid("f" + binary.hex()) == cid
+    assert parse_cid("z" + _b58encode(binary)) == cid
+    assert raw_cid(cid.digest) == str(cid)
+
+
+def test_unsupported_cid_is_rejected():
+    with pytest.raises(ValueError):
+        parse_cid("not-a-cid")
+
+
+@pytest.mark.parametrize("name", SINGLE_BLOCK_FILES)
+def test_single_block_file_verifies(name):
+    data = read_upload(name)
+    cid = parse_cid(name)
+    block = file_leaf(data)
+
+    verify_block(cid, block)
+    assert file_block_contents(cid, block) == (data, [])
+
+
+@pytest.mark.parametrize("name", SINGLE_BLOCK_FILES)
+def test_tampered_block_is_rejected(name):
+    block = bytearray(file_leaf(read_upload(name)))
+    block[-1] ^= 1
+
+    with pytest.raises(InvalidBlock):
+        verify_block(parse_cid(name), bytes(block))
+
+
+def test_multi_block_root_links_its_chunks():
+    data = read_upload(MULTI_BLOCK_FILE)
+    root_cid, blocks = build_dag(data)
+    assert str(root_cid) == MULTI_BLOCK_FILE
+
+    content, links = file_block_contents(root_cid, blocks[MULTI_BLOCK_FILE])
+    assert content == b""
+    assert b"".join(file_block_contents(c, blocks[str(c)])[0] for c in links) == data
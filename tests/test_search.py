@@ -0,0 +1,22 @@
+def test_search_pages_do_not_repeat_rows(client, login):
+    login()
+    for number in range(5):
+        response = client.post(
+            "/upload", files={"file": (f"page{number}.txt", f"body {number}".encode())}
+        )
+        assert response.status_code == 200, response.text
+
+    seen, cursor = [], None
+    # Bounded, so a cursor that keeps returning the boundary row fails the test
+    for _ in range(5):
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/files/search", params=params).json()
+        seen += [row["id"] for row in body["results"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
@@ -0,0 +1,66 @@
+import pytest
+
+from storage import LocalStorage, TieredStorage, TieringPolicy
+
+
+def upload(storage, folder, name, data):
+    folder.mkdir(exist_ok=True)
+    path = folder / name
+    path.write_bytes(data)
+    return storage.upload_file(str(path))
+
+
+def test_overwritten_key_keeps_serving_old_cid(tmp_path):
+    storage = LocalStorage(str(tmp_path / "store"))
+    first = upload(storage, tmp_path / "user1", "a.txt", b"first user's file")
+    second = upload(storage, tmp_path / "user2", "a.txt", b"second user's file")
+
+    assert storage.download_file(first) == b"first user's file"
+    assert b"".join(storage.iter_download(first)) == b"first user's file"
+    assert storage.download_file(second) == b"second user's file"
+    assert storage.get_object("a.txt") == b"second user's file"
+    assert storage.key_for(first) is None
+    assert storage.key_for(second) == "a.txt"
+
+
+def test_corrupt_local_copy_is_not_served(tmp_path):
+    storage = LocalStorage(str(tmp_path / "store"))
+    cid = storage.put_object("a.txt", b"original")
+    (tmp_path / "store" / "blobs" / cid).write_bytes(b"tampered")
+
+    with pytest.raises(Exception, match="not in local storage"):
+        storage.download_file(cid)
+
+
+def test_hot_tier_serves_only_the_requested_cid(tmp_path):
+    hot = LocalStorage(str(tmp_path / "hot"))
+    cold = LocalStorage(str(tmp_path / "cold"))
+    tiered = TieredStorage(hot, cold, TieringPolicy(1024, 3600))
+
+    first = upload(tiered, tmp_path / "user1", "a.txt", b"first user's file")
+    second = upload(tiered, tmp_path / "user2", "a.txt", b"second user's file")
+    # The replaced hot copy was dropped rather than left behind uncounted
+    assert tiered.policy.hot_bytes == len(b"second user's file")
+
+    assert tiered.download_file(first) == b"first user's file"
+    assert tiered.download_file(second) == b"second user's file"
+    assert tiered.get_object("a.txt") == b"second user's file"
+
+
+def test_same_filename_from_two_users(client, login, monkeypatch):
+    import app as app_module
+
+    # Compressed bytes served for the wrong CID used to fail to decode
+    monkeypatch.setattr(app_module.settings, "STORAGE_COMPRESSION", "gzip")
+    first_body, second_body = b"first user " * 2000, b"second user " * 2000
+
+    login()
+    first = client.post("/upload", files={"file": ("a.txt", first_body)}).json()
+    login()
+    second = client.post("/upload", files={"file": ("a.txt", second_body)}).json()
+    assert first["ipfs_hash"] != second["ipfs_hash"]
+
+    for upload, body in ((first, first_body), (second, second_body)):
+        response = client.get("/download", params={"ipfs_hash": upload["ipfs_hash"]})
+        assert response.status_code == 200
+        assert response.content == body
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def async_uploads(app, monkeypatch):
+    import app as app_module
+
+    # Set before the client starts the app, which is when the queue starts
+    monkeypatch.setattr(app_module.settings, "ASYNC_UPLOADS", True)
+    return app_module.upload_queue
+
+
+def wait_for_job(client, job_id):
+    for _ in range(100):
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} never finished")
+
+
+def test_failed_follow_up_does_not_requeue_a_recorded_job(
+    async_uploads, client, login, monkeypatch
+):
+    def broken_preview(job):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(async_uploads, "on_file_recorded", broken_preview)
+    login()
+    response = client.post("/upload", files={"file": ("queued.txt", b"queued")})
+    assert response.status_code == 202
+
+    job = wait_for_job(client, response.json()["job_id"])
+    time.sleep(0.2)  # Long enough for a wrongly scheduled retry to run
+    job = client.get(f"/upload/jobs/{job['job_id']}").json()
+    assert job["status"] == "done"
+    assert job["attempts"] == 1
+    results = client.get("/api/files/search", params={"q": "queued"}).json()
+    assert len(results["results"]) == 1
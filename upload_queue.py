@@ -0,0 +1,236 @@
+# upload_queue.py - Background pinning of staged uploads
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database import db_manager, File, FileEncoding, UploadJob
+from reconcile import record_stored_object
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ("queued", "running")
+
+
+class UploadQueue:
+    """
+    Pins staged uploads to IPFS from a pool of asyncio workers.
+
+    Jobs are persisted in the upload_jobs table, so anything queued or in
+    flight when the process stops is picked up again by start().
+    """
+
+    def __init__(
+        self,
+        ipfs_client,
+        blockchain,
+        staging_folder,
+        workers=2,
+        max_attempts=5,
+        backoff_base=2.0,
+        backoff_max=300.0,
+        on_file_recorded=None,
+        chunk_store=None,
+    ):
+        self.ipfs_client = ipfs_client
+        self.blockchain = blockchain
+        self.staging_folder = staging_folder
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Called with the finished job after its File row is committed, while
+        # the staged file still exists
+        self.on_file_recorded = on_file_recorded
+        # When set, files are stored as deduplicated chunks instead of whole
+        self.chunk_store = chunk_store
+
+        self._queue = None
+        self._tasks = []
+
+    def staging_path(self, job_id, filename):
+        """
+        Local path a job's bytes are staged at.
+
+        Each job gets its own directory so the file keeps its original name,
+        which IPFSClient.upload_file uses as the S3 key.
+        """
+        return os.path.join(self.staging_folder, job_id, filename)
+
+    async def start(self):
+        """Spawn the workers and re-queue jobs left over from a previous run"""
+        self._queue = asyncio.Queue()
+
+        async with db_manager.async_session_maker() as session:
+            result = await session.execute(
+                select(UploadJob).where(UploadJob.status.in_(PENDING_STATUSES))
+            )
+            jobs = result.scalars().all()
+
+        for job in jobs:
+            delay = 0.0
+            if job.next_attempt_at:
+                delay = max(0.0, (job.next_attempt_at - datetime.now()).total_seconds())
+            self._schedule(job.id, delay)
+
+        if jobs:
+            logger.info(f"♻️ Recovered {len(jobs)} pending upload job(s)")
+
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"Upload queue started with {self.workers} worker(s)")
+
+    async def stop(self):
+        """Cancel the workers; in-flight jobs are resumed on next start()"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(
+        self, session, job_id, filename, owner_email, content_encoding=None
+    ):
+        """
+        Persist a job for a file already written to staging_path() and queue it
+
+        Returns:
+            UploadJob: The newly created job
+        """
+        job = UploadJob(
+            id=job_id,
+            filename=filename,
+            owner_email=owner_email,
+            staged_path=self.staging_path(job_id, filename),
+            content_encoding=content_encoding,
+            status="queued",
+        )
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+
+        self._schedule(job.id)
+        logger.info(f"📥 Queued upload job {job.id} for {filename}")
+        return job
+
+    @staticmethod
+    def new_job_id():
+        return uuid.uuid4().hex
+
+    def _schedule(self, job_id, delay=0.0):
+        if delay <= 0:
+            self._queue.put_nowait(job_id)
+        else:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job_id)
+
+    def _backoff(self, attempts):
+        return min(self.backoff_max, self.backoff_base**attempts)
+
+    async def _worker(self, worker_id):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Upload worker {worker_id} crashed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id):
+        async with db_manager.async_session_maker() as session:
+            job = await session.get(UploadJob, job_id)
+            if not job or job.status not in PENDING_STATUSES:
+                return
+
+            job.status = "running"
+            job.attempts += 1
+            await session.commit()
+
+            try:
+                if self.chunk_store:
+                    ipfs_hash = await self.chunk_store.store_file(
+                        session, job.staged_path
+                    )
+                else:
+                    ipfs_hash = await asyncio.to_thread(
+                        self.ipfs_client.upload_file,
+                        job.staged_path,
+                        job.content_encoding,
+                    )
+                logger.info(
+                    f"☁️ File uploaded to IPFS: {job.filename}, CID: {ipfs_hash}"
+                )
+
+                session.add(
+                    File(
+                        filename=job.filename,
+                        ipfs_hash=ipfs_hash,
+                        owner_email=job.owner_email,
+                    )
+                )
+                if job.content_encoding:
+                    await session.merge(
+                        FileEncoding(ipfs_hash=ipfs_hash, codec=job.content_encoding)
+                    )
+                if not self.chunk_store:
+                    # Let downloads find the object without a bucket scan
+                    await record_stored_object(
+                        session,
+                        os.path.basename(job.staged_path),
+                        ipfs_hash,
+                        os.path.getsize(job.staged_path),
+                    )
+                job.status = "done"
+                job.ipfs_hash = ipfs_hash
+                job.error = None
+                job.next_attempt_at = None
+                await session.commit()
+
+            except Exception as e:
+                await session.rollback()
+                job = await session.get(UploadJob, job_id)
+                job.error = str(e)[:500]
+
+                if not os.path.exists(job.staged_path) or job.attempts >= self.max_attempts:
+                    job.status = "failed"
+                    job.next_attempt_at = None
+                    await session.commit()
+                    logger.error(
+                        f"❌ Upload job {job.id} failed after {job.attempts} attempt(s): {e}"
+                    )
+                    self._discard_staged(job)
+                    return
+
+                delay = self._backoff(job.attempts)
+                job.status = "queued"
+                job.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+                await session.commit()
+                logger.warning(
+                    f"⚠️ Upload job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {e}"
+                )
+                self._schedule(job.id, delay)
+                return
+
+        # The job is committed as done from here on, so a failure below must
+        # not send it back to the queue to be pinned and recorded again
+        try:
+            new_block = self.blockchain.create_block(job.filename, ipfs_hash)
+            self.blockchain.save_to_file()
+            logger.info(f"⛓️ Block #{new_block.index} added to blockchain")
+            if self.on_file_recorded:
+                self.on_file_recorded(job)
+        except Exception as e:
+            logger.error(f"❌ Follow-up for upload job {job.id} failed: {e}")
+        logger.info(f"✅ Upload job {job.id} complete for {job.owner_email}")
+        self._discard_staged(job)
+
+    def _discard_staged(self, job):
+        job_dir = os.path.dirname(job.staged_path)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        logger.info(f"🧹 Staged upload cleaned up: {job.filename}")